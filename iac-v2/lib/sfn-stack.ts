@@ -10,6 +10,11 @@ import * as sfn_tasks from "aws-cdk-lib/aws-stepfunctions-tasks";
 import type { Construct } from "constructs";
 
 const PARALLEL_COUNT = 4;
+// Generate all candidates inside one GenImg invocation instead of one per branch.
+const GEN_IMG_FAN_OUT = false;
+// Fan-out only: after the budget, keep whatever candidates are ready.
+const GEN_IMG_MIN_CANDIDATES = 2;
+const GEN_IMG_BUDGET_SECONDS = 60;
 
 type SfnStackProps = cdk.StackProps & {
   genTextRepository: ecr.Repository;
@@ -34,6 +39,12 @@ export class SfnStack extends cdk.Stack {
     const genTextFunction = createGenTextFunction(
       this,
       props.genTextRepository,
+      bucket,
+    );
+    const refillRecipePoolFunction = createRefillRecipePoolFunction(
+      this,
+      props.genTextRepository,
+      bucket,
     );
     const genImgFunction = createGenImgFunction(
       this,
@@ -77,32 +88,120 @@ export class SfnStack extends cdk.Stack {
         }),
       ],
     });
+
+    new events.Rule(this, "MusabiRefillRecipePoolRule", {
+      schedule: events.Schedule.cron({ hour: "17", minute: "0" }),
+      targets: [new events_targets.LambdaFunction(refillRecipePoolFunction)],
+    });
   }
 }
 
-const createGenTextFunction = (scope: Construct, ecrRepo: ecr.Repository) => {
-  const genTextFunction = new lambda.DockerImageFunction(
-    scope,
-    "GenTextLambda",
-    {
-      functionName: "GenTextFunction",
-      code: lambda.DockerImageCode.fromEcr(ecrRepo),
-      timeout: cdk.Duration.minutes(3),
-    },
+const RECIPE_POOL_PREFIX = "recipe-pool/";
+const DISH_INDEX_PREFIX = "dish-index/";
+const GEN_IMG_CACHE_PREFIX = "gen-img-cache/";
+const LATENCY_PREFIX = "latency/";
+
+// Without ListBucket, S3 answers 403 rather than 404 for a missing key.
+const addListBucketPolicy = (
+  func: lambda.IFunction,
+  bucket: s3.Bucket,
+  prefixes: string[],
+) => {
+  func.addToRolePolicy(
+    new iam.PolicyStatement({
+      effect: iam.Effect.ALLOW,
+      actions: ["s3:ListBucket"],
+      resources: [bucket.bucketArn],
+      conditions: {
+        StringLike: { "s3:prefix": prefixes.map((prefix) => `${prefix}*`) },
+      },
+    }),
   );
-  genTextFunction.addToRolePolicy(
+};
+
+const addGenTextPolicies = (func: lambda.IFunction, bucket: s3.Bucket) => {
+  addListBucketPolicy(func, bucket, [
+    RECIPE_POOL_PREFIX,
+    DISH_INDEX_PREFIX,
+    LATENCY_PREFIX,
+  ]);
+  func.addToRolePolicy(
     new iam.PolicyStatement({
       effect: iam.Effect.ALLOW,
-      actions: ["ssm:GetParameter"],
+      actions: ["s3:GetObject", "s3:PutObject"],
+      resources: [
+        bucket.arnForObjects(`${RECIPE_POOL_PREFIX}*`),
+        bucket.arnForObjects(`${LATENCY_PREFIX}*`),
+      ],
+    }),
+  );
+  func.addToRolePolicy(
+    new iam.PolicyStatement({
+      effect: iam.Effect.ALLOW,
+      actions: ["s3:GetObject"],
+      resources: [bucket.arnForObjects(`${DISH_INDEX_PREFIX}*`)],
+    }),
+  );
+  func.addToRolePolicy(
+    new iam.PolicyStatement({
+      effect: iam.Effect.ALLOW,
+      actions: ["ssm:GetParameters"],
       resources: [
         `arn:aws:ssm:ap-northeast-1:${cdk.Aws.ACCOUNT_ID}:parameter/openai/musabi/*`,
         `arn:aws:ssm:ap-northeast-1:${cdk.Aws.ACCOUNT_ID}:parameter/langsmith/musabi/*`,
       ],
     }),
   );
+};
+
+const createGenTextFunction = (
+  scope: Construct,
+  ecrRepo: ecr.Repository,
+  bucket: s3.Bucket,
+) => {
+  const genTextFunction = new lambda.DockerImageFunction(
+    scope,
+    "GenTextLambda",
+    {
+      functionName: "GenTextFunction",
+      code: lambda.DockerImageCode.fromEcr(ecrRepo),
+      timeout: cdk.Duration.minutes(3),
+      environment: {
+        RECIPE_POOL_BUCKET: bucket.bucketName,
+        DISH_INDEX_BUCKET: bucket.bucketName,
+        LATENCY_BUCKET: bucket.bucketName,
+      },
+    },
+  );
+  addGenTextPolicies(genTextFunction, bucket);
   return genTextFunction;
 };
 
+const createRefillRecipePoolFunction = (
+  scope: Construct,
+  ecrRepo: ecr.Repository,
+  bucket: s3.Bucket,
+) => {
+  const refillFunction = new lambda.DockerImageFunction(
+    scope,
+    "RefillRecipePoolLambda",
+    {
+      functionName: "RefillRecipePoolFunction",
+      code: lambda.DockerImageCode.fromEcr(ecrRepo, {
+        cmd: ["src.gen_text.handler.refill_handler"],
+      }),
+      timeout: cdk.Duration.minutes(10),
+      environment: {
+        RECIPE_POOL_BUCKET: bucket.bucketName,
+        DISH_INDEX_BUCKET: bucket.bucketName,
+        LATENCY_BUCKET: bucket.bucketName,
+      },
+    },
+  );
+  addGenTextPolicies(refillFunction, bucket);
+  return refillFunction;
+};
+
 const createGenImgFunction = (
   scope: Construct,
   ecrRepo: ecr.Repository,
@@ -126,7 +225,15 @@ const createGenImgFunction = (
   genImgFunction.addToRolePolicy(
     new iam.PolicyStatement({
       effect: iam.Effect.ALLOW,
-      actions: ["ssm:GetParameter"],
+      actions: ["s3:GetObject"],
+      resources: [bucket.arnForObjects(`${GEN_IMG_CACHE_PREFIX}*`)],
+    }),
+  );
+  addListBucketPolicy(genImgFunction, bucket, [GEN_IMG_CACHE_PREFIX]);
+  genImgFunction.addToRolePolicy(
+    new iam.PolicyStatement({
+      effect: iam.Effect.ALLOW,
+      actions: ["ssm:GetParameters"],
       resources: [
         `arn:aws:ssm:ap-northeast-1:${cdk.Aws.ACCOUNT_ID}:parameter/google/gemini/musabi/*`,
         `arn:aws:ssm:ap-northeast-1:${cdk.Aws.ACCOUNT_ID}:parameter/langsmith/musabi/*`,
@@ -164,7 +271,7 @@ const createSelectImgFunction = (
   selectImgFunction.addToRolePolicy(
     new iam.PolicyStatement({
       effect: iam.Effect.ALLOW,
-      actions: ["ssm:GetParameter"],
+      actions: ["ssm:GetParameters"],
       resources: [
         `arn:aws:ssm:ap-northeast-1:${cdk.Aws.ACCOUNT_ID}:parameter/google/gemini/musabi/*`,
       ],
@@ -211,6 +318,7 @@ const createPubImgFunction = (
     timeout: cdk.Duration.minutes(3),
     environment: {
       IMAGE_BUCKET: bucket.bucketName,
+      DISH_INDEX_BUCKET: bucket.bucketName,
     },
   });
   pubImgFunction.addToRolePolicy(
@@ -223,7 +331,15 @@ const createPubImgFunction = (
   pubImgFunction.addToRolePolicy(
     new iam.PolicyStatement({
       effect: iam.Effect.ALLOW,
-      actions: ["ssm:GetParameter"],
+      actions: ["s3:PutObject"],
+      resources: [bucket.arnForObjects(`${DISH_INDEX_PREFIX}*`)],
+    }),
+  );
+  addListBucketPolicy(pubImgFunction, bucket, [DISH_INDEX_PREFIX]);
+  pubImgFunction.addToRolePolicy(
+    new iam.PolicyStatement({
+      effect: iam.Effect.ALLOW,
+      actions: ["ssm:GetParameters"],
       resources: [
         `arn:aws:ssm:ap-northeast-1:${cdk.Aws.ACCOUNT_ID}:parameter/meta/musabi/*`,
       ],
@@ -257,6 +373,27 @@ const createParallelGenImgStep = (
   return parallelGenImgStep;
 };
 
+const createFanOutGenImgStep = (
+  scope: Construct,
+  genImgFunction: lambda.IFunction,
+) => {
+  return new sfn_tasks.LambdaInvoke(scope, "GenImg", {
+    lambdaFunction: genImgFunction,
+    integrationPattern: sfn.IntegrationPattern.REQUEST_RESPONSE,
+    payload: sfn.TaskInput.fromObject({
+      DishName: sfn.JsonPath.stringAt("$.GenTextResults.Payload.DishName"),
+      Ingredients: sfn.JsonPath.stringAt(
+        "$.GenTextResults.Payload.Ingredients",
+      ),
+      ExecName: sfn.JsonPath.stringAt("$$.Execution.Name"),
+      CandidateCount: PARALLEL_COUNT,
+      MinCandidateCount: GEN_IMG_MIN_CANDIDATES,
+      BudgetSeconds: GEN_IMG_BUDGET_SECONDS,
+    }),
+    resultPath: "$.GenImgResults",
+  });
+};
+
 const createStateMachine = (
   scope: Construct,
   genTextFunction: lambda.IFunction,
@@ -268,18 +405,26 @@ const createStateMachine = (
 ) => {
   const genTextStep = new sfn_tasks.LambdaInvoke(scope, "GenText", {
     lambdaFunction: genTextFunction,
+    payload: sfn.TaskInput.fromObject({
+      ExecName: sfn.JsonPath.stringAt("$$.Execution.Name"),
+    }),
     integrationPattern: sfn.IntegrationPattern.REQUEST_RESPONSE,
     resultPath: "$.GenTextResults",
   });
 
-  const parallelGenImgStep = createParallelGenImgStep(scope, genImgFunction);
+  const genImgStep = GEN_IMG_FAN_OUT
+    ? createFanOutGenImgStep(scope, genImgFunction)
+    : createParallelGenImgStep(scope, genImgFunction);
 
   const selectImgStep = new sfn_tasks.LambdaInvoke(scope, "SelectImg", {
     lambdaFunction: selectImgFunction,
     payload: sfn.TaskInput.fromObject({
       ImageKeys: sfn.JsonPath.listAt(
-        "$.ParallelGenImgResults[*].Payload.ImgKey",
+        GEN_IMG_FAN_OUT
+          ? "$.GenImgResults.Payload.ImageKeys"
+          : "$.ParallelGenImgResults[*].Payload.ImgKey",
       ),
+      ExecName: sfn.JsonPath.stringAt("$$.Execution.Name"),
     }),
     integrationPattern: sfn.IntegrationPattern.REQUEST_RESPONSE,
     resultPath: "$.SelectImgResults",
@@ -313,6 +458,7 @@ const createStateMachine = (
       ),
       ImgKey: sfn.JsonPath.stringAt("$.SelectImgResults.Payload.ImgKey"),
       DryRun: sfn.JsonPath.stringAt("$.DryRun"),
+      ExecName: sfn.JsonPath.stringAt("$$.Execution.Name"),
     }),
     integrationPattern: sfn.IntegrationPattern.REQUEST_RESPONSE,
   });
@@ -323,7 +469,7 @@ const createStateMachine = (
     stateMachineName: "musabi-statemachine",
     definitionBody: sfn.DefinitionBody.fromChainable(
       genTextStep
-        .next(parallelGenImgStep)
+        .next(genImgStep)
         .next(selectImgStep)
         .next(editImgStep)
         .next(pubImgStep)
@@ -0,0 +1,62 @@
+import sys
+import time
+
+from PIL import Image, ImageFilter
+
+from src.edit_img.handler import create_title
+from src.shared.s3 import ImageEncoding, encode_image
+
+FONT_PATH = "src/edit_img/fonts/Bold.ttf"
+ENCODINGS = {
+    "PNG level 1": ImageEncoding(compress_level=1),
+    "PNG level 6 (default)": ImageEncoding(compress_level=6),
+    "PNG level 9": ImageEncoding(compress_level=9),
+    "JPEG q85": ImageEncoding(format="JPEG", quality=85),
+    "JPEG q90 optimize": ImageEncoding(format="JPEG", quality=90, optimize=True),
+    "JPEG q90 progressive": ImageEncoding(
+        format="JPEG",
+        quality=90,
+        optimize=True,
+        progressive=True,
+    ),
+    "WebP q80": ImageEncoding(format="WEBP", quality=80),
+    "WebP q90": ImageEncoding(format="WEBP", quality=90),
+}
+
+
+def dish_image(size: int = 1024) -> Image.Image:
+    # Stand-in for a GenImg photo: smooth gradients with fine sensor-like noise.
+    gradient = Image.linear_gradient("L").resize((size, size))
+    base = Image.merge(
+        "RGB",
+        (gradient, gradient.rotate(90), gradient.rotate(180)),
+    ).filter(ImageFilter.GaussianBlur(8))
+    noise = Image.effect_noise((size, size), 24).convert("RGB")
+    return Image.blend(base, noise, 0.15)
+
+
+def title_image(photo: Image.Image) -> Image.Image:
+    w, h = photo.size
+    blur_image = photo.convert("RGBA").filter(ImageFilter.GaussianBlur(4))
+    title = create_title(w, h, "鶏むね肉の柚子胡椒レモンソテー", FONT_PATH)
+    return Image.alpha_composite(blur_image, title)
+
+
+def main(iterations: int = 5) -> None:
+    photo = dish_image()
+    images = {"GenImg RGB": photo, "EditImg RGBA": title_image(photo)}
+    sys.stdout.write(f"| image | encoding | encode ms | KiB |\n{'|---' * 4}|\n")
+    for image_name, image in images.items():
+        for encoding_name, encoding in ENCODINGS.items():
+            start = time.perf_counter()
+            for _ in range(iterations):
+                data = encode_image(image, encoding)
+            elapsed = (time.perf_counter() - start) * 1000 / iterations
+            sys.stdout.write(
+                f"| {image_name} | {encoding_name} | {elapsed:.1f} "
+                f"| {len(data) / 1024:.0f} |\n",
+            )
+
+
+if __name__ == "__main__":
+    main()
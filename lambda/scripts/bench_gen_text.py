@@ -0,0 +1,69 @@
+import json
+import os
+import statistics
+import sys
+import time
+from collections.abc import Callable
+from functools import partial
+
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_openai import ChatOpenAI
+
+from scripts.stub_openai import StubOpenAIHandler, start_stub_openai
+from src.gen_text.handler import DEFAULT_MODEL_PARAMS, Dish, get_chain, get_message
+
+MESSAGE = get_message("和食", "鶏肉", "時短")
+
+
+def generate_dish_per_call(message: str) -> Dish:
+    prompt = ChatPromptTemplate.from_messages([("human", message)])
+    model = ChatOpenAI(**DEFAULT_MODEL_PARAMS.model_dump())
+    chain = prompt | model.with_structured_output(Dish)
+    return chain.invoke({})  # type: ignore[return-value]
+
+
+def generate_dish_cached(message: str) -> Dish:
+    dish: Dish = get_chain(DEFAULT_MODEL_PARAMS).invoke({"message": message})
+    return dish
+
+
+def measure(func: Callable[[], object], iterations: int) -> list[float]:
+    func()
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(name: str, timings: list[float], connections: int) -> None:
+    p95 = statistics.quantiles(timings, n=20)[-1]
+    sys.stdout.write(
+        f"{name:<16} mean {statistics.mean(timings):7.2f} ms"
+        f"  p50 {statistics.median(timings):7.2f} ms  p95 {p95:7.2f} ms"
+        f"  connections {connections}\n",
+    )
+
+
+def main(iterations: int = 200) -> None:
+    server, endpoint = start_stub_openai()
+    StubOpenAIHandler.content = json.dumps(
+        Dish(dish_name="stub", ingredients=["a"], steps=["b"]).model_dump(),
+        ensure_ascii=False,
+    )
+    os.environ["OPENAI_BASE_URL"] = endpoint
+    os.environ["OPENAI_API_KEY"] = "bench"
+    # The stub answers instantly, so the timings are all client-side overhead.
+    for name, func in (
+        ("per-call chain", generate_dish_per_call),
+        ("cached chain", generate_dish_cached),
+    ):
+        before = StubOpenAIHandler.connections
+        timings = measure(partial(func, MESSAGE), iterations)
+        report(name, timings, StubOpenAIHandler.connections - before)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
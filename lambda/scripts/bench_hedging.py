@@ -0,0 +1,68 @@
+import json
+import os
+import statistics
+import sys
+import time
+from collections.abc import Callable
+
+from scripts.stub_openai import StubOpenAIHandler, start_stub_openai
+from src.gen_text.handler import DEFAULT_MODEL_PARAMS, Dish, get_chain, get_message
+from src.shared.hedging import Deadline, LatencyTracker, hedged_call
+
+MESSAGE = get_message("和食", "鶏肉", "時短")
+
+
+def measure(func: Callable[[], object], iterations: int) -> tuple[list[float], float]:
+    before = StubOpenAIHandler.requests
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    # Let abandoned hedges finish so they are counted.
+    time.sleep(StubOpenAIHandler.stall_latency)
+    return timings, (StubOpenAIHandler.requests - before) / iterations
+
+
+def report(name: str, timings: list[float], requests: float) -> None:
+    quantiles = statistics.quantiles(timings, n=100)
+    sys.stdout.write(
+        f"{name:<10} mean {statistics.mean(timings):7.1f} ms"
+        f"  p50 {quantiles[49]:7.1f}  p95 {quantiles[94]:7.1f}"
+        f"  p99 {quantiles[98]:7.1f}  max {max(timings):7.1f} ms"
+        f"  requests/call {requests:.2f}\n",
+    )
+
+
+def main(iterations: int = 400) -> None:
+    server, endpoint = start_stub_openai()
+    StubOpenAIHandler.content = json.dumps(
+        Dish(dish_name="stub", ingredients=["a"], steps=["b"]).model_dump(),
+        ensure_ascii=False,
+    )
+    StubOpenAIHandler.latency = 0.05
+    StubOpenAIHandler.stall_rate = 0.05
+    StubOpenAIHandler.stall_latency = 1.0
+    os.environ["OPENAI_BASE_URL"] = endpoint
+    os.environ["OPENAI_API_KEY"] = "bench"
+    chain = get_chain(DEFAULT_MODEL_PARAMS)
+    chain.invoke({"message": MESSAGE})
+
+    tracker = LatencyTracker(default=1.0)
+    report("plain", *measure(lambda: chain.invoke({"message": MESSAGE}), iterations))
+    report(
+        "hedged",
+        *measure(
+            lambda: hedged_call(
+                lambda: chain.invoke({"message": MESSAGE}),
+                Deadline(),
+                tracker,
+            ),
+            iterations,
+        ),
+    )
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
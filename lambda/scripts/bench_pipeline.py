@@ -0,0 +1,53 @@
+import io
+import os
+import statistics
+import sys
+import time
+from collections.abc import Callable
+from contextlib import redirect_stdout
+
+from loguru import logger
+
+from scripts.bench_encode import dish_image
+from src.edit_img.handler import EditImgArgs
+from src.edit_img.handler import main as edit_img_main
+from src.select_img.handler import decode_images
+from src.shared.s3 import put_images
+
+BUCKET = "musabi-bench"
+EXEC_NAME = "bench"
+CANDIDATES = 4
+
+
+def measure(name: str, func: Callable[[], object], iterations: int) -> None:
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        with redirect_stdout(io.StringIO()):
+            func()
+        timings.append((time.perf_counter() - start) * 1000)
+    sys.stdout.write(
+        f"{name:<16} mean {statistics.mean(timings):8.1f} ms"
+        f"  min {min(timings):8.1f} ms\n",
+    )
+
+
+def main(iterations: int = 5) -> None:
+    # Offline by default; STORAGE_LATENCY_MS / STORAGE_BANDWIDTH_MBPS shape the link.
+    os.environ.setdefault("STORAGE_BACKEND", "memory")
+    logger.remove()
+
+    keys = [f"{EXEC_NAME}/1-{i}.png" for i in range(CANDIDATES)]
+    put_images([(dish_image(), BUCKET, key) for key in keys])
+    edit_args = EditImgArgs(
+        bucket_name=BUCKET,
+        title="鶏むね肉の柚子胡椒レモンソテー",
+        image_key=keys[0],
+        exec_name=EXEC_NAME,
+    )
+    measure("select_img", lambda: decode_images(BUCKET, keys), iterations)
+    measure("edit_img", lambda: edit_img_main(edit_args), iterations)
+
+
+if __name__ == "__main__":
+    main()
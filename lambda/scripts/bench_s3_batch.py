@@ -0,0 +1,46 @@
+import os
+import sys
+import time
+
+from PIL import Image
+
+from scripts.stub_s3 import StubS3Handler, start_stub_s3
+from src.shared.s3 import get_image, get_images, put_image
+
+BUCKET = "musabi-bench"
+CANDIDATES = 4
+LATENCY_SECONDS = 0.2
+
+
+def main() -> None:
+    server, endpoint = start_stub_s3()
+    os.environ["AWS_ENDPOINT_URL_S3"] = endpoint
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+    os.environ.setdefault("AWS_DEFAULT_REGION", "ap-northeast-1")
+
+    keys = [f"bench/1-{i}.png" for i in range(CANDIDATES)]
+    for key in keys:
+        put_image(Image.effect_noise((1024, 1024), 64), BUCKET, key)
+    get_images(BUCKET, keys)
+    StubS3Handler.latency = LATENCY_SECONDS
+
+    start = time.perf_counter()
+    for key in keys:
+        get_image(BUCKET, key)
+    sequential = time.perf_counter() - start
+
+    start = time.perf_counter()
+    get_images(BUCKET, keys)
+    batched = time.perf_counter() - start
+
+    sys.stdout.write(
+        f"{CANDIDATES} candidates, {LATENCY_SECONDS * 1000:.0f} ms per object\n"
+        f"sequential get_image {sequential * 1000:7.1f} ms\n"
+        f"get_images           {batched * 1000:7.1f} ms\n",
+    )
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+import io
+import os
+import statistics
+import sys
+import time
+from collections.abc import Callable
+
+import boto3
+from PIL import Image
+
+from scripts.stub_s3 import start_stub_s3
+from src.shared.s3 import get_image, put_image
+
+BUCKET = "musabi-bench"
+KEY = "bench/1-0.png"
+
+
+def get_image_per_call_client(bucket_name: str, s3_object_key: str) -> Image.Image:
+    s3_client = boto3.client("s3")
+    response = s3_client.get_object(Bucket=bucket_name, Key=s3_object_key)
+    return Image.open(io.BytesIO(response["Body"].read()))
+
+
+def measure(func: Callable[[], object], iterations: int) -> list[float]:
+    func()
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(name: str, timings: list[float]) -> None:
+    p95 = statistics.quantiles(timings, n=20)[-1]
+    sys.stdout.write(
+        f"{name:<24} mean {statistics.mean(timings):7.2f} ms"
+        f"  p50 {statistics.median(timings):7.2f} ms  p95 {p95:7.2f} ms\n",
+    )
+
+
+def main(iterations: int = 200) -> None:
+    server, endpoint = start_stub_s3()
+    os.environ["AWS_ENDPOINT_URL_S3"] = endpoint
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+    os.environ.setdefault("AWS_DEFAULT_REGION", "ap-northeast-1")
+
+    put_image(Image.new("RGB", (64, 64)), BUCKET, KEY)
+    report(
+        "per-call client",
+        measure(lambda: get_image_per_call_client(BUCKET, KEY), iterations),
+    )
+    report("shared client", measure(lambda: get_image(BUCKET, KEY), iterations))
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
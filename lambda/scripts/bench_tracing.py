@@ -0,0 +1,155 @@
+import base64
+import os
+import statistics
+import sys
+import threading
+import time
+from collections.abc import Callable
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, ClassVar
+
+from google.genai import types
+from langsmith import Client, traceable, tracing_context
+
+from src.gen_img.client import redact_response
+from src.shared import tracing
+from src.shared.tracing import redact
+
+# Roughly what gemini-2.0-flash returns for a 1024x1024 image.
+IMAGE_BYTES = 1_500_000
+SELECT_IMAGES = 4
+
+
+class SinkHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    received: ClassVar[int] = 0
+
+    def _reply(self) -> None:
+        body = b"{}"
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:  # noqa: N802
+        self._reply()
+
+    def do_POST(self) -> None:  # noqa: N802
+        length = int(self.headers.get("Content-Length", "0"))
+        SinkHandler.received += len(self.rfile.read(length))
+        self._reply()
+
+    def log_message(self, format: str, *args: object) -> None:  # noqa: A002
+        pass
+
+
+def gemini_response() -> types.GenerateContentResponse:
+    return types.GenerateContentResponse(
+        candidates=[
+            types.Candidate(
+                content=types.Content(
+                    role="model",
+                    parts=[
+                        types.Part(text="Here is the image."),
+                        types.Part(
+                            inline_data=types.Blob(
+                                mime_type="image/png",
+                                data=os.urandom(IMAGE_BYTES),
+                            ),
+                        ),
+                    ],
+                ),
+            ),
+        ],
+    )
+
+
+def select_messages() -> list[dict[str, Any]]:
+    image = base64.b64encode(os.urandom(IMAGE_BYTES // 2)).decode()
+    return [
+        {"type": "text", "text": "Select the best image."},
+        *(
+            {
+                "type": "image_url",
+                "image_url": {"url": f"data:image/png;base64,{image}"},
+            }
+            for _ in range(SELECT_IMAGES)
+        ),
+    ]
+
+
+def measure(
+    name: str,
+    func: Callable[[], object],
+    client: Client,
+    iterations: int,
+) -> None:
+    before = SinkHandler.received
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        with tracing_context(client=client, enabled=True):
+            func()
+        timings.append((time.perf_counter() - start) * 1000)
+    # Background serialization and upload are part of the cost, so wait for them.
+    start = time.perf_counter()
+    client.flush()
+    flush_ms = (time.perf_counter() - start) * 1000
+    sys.stdout.write(
+        f"{name:<24} call {statistics.mean(timings):7.2f} ms"
+        f"  +flush {flush_ms / iterations:7.2f} ms"
+        f"  uploaded {(SinkHandler.received - before) / iterations / 1024:8.1f} KiB\n",
+    )
+
+
+def main(iterations: int = 20) -> None:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SinkHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    endpoint = f"http://{host!s}:{port}"
+    response = gemini_response()
+    messages = select_messages()
+
+    def generate_content(**_: object) -> types.GenerateContentResponse:
+        return response
+
+    def invoke(messages: list[dict[str, Any]]) -> int:
+        return len(messages)
+
+    plain_client = Client(api_url=endpoint, api_key="bench")
+    redacting_client = Client(
+        api_url=endpoint,
+        api_key="bench",
+        hide_inputs=redact,
+        hide_outputs=redact,
+    )
+    raw = traceable(name="gemini_generate_content")(generate_content)
+    slim = traceable(
+        name="gemini_generate_content",
+        process_outputs=redact_response,
+    )(generate_content)
+    select = traceable(name="select_image")(invoke)
+
+    measure("gen_img full payload", lambda: raw(), plain_client, iterations)
+    measure("gen_img placeholders", lambda: slim(), plain_client, iterations)
+    tracing.TRACE_SAMPLE_RATE = 0.1
+    measure(
+        "gen_img sampled 10%",
+        lambda: slim() if tracing.should_trace() else generate_content(),
+        plain_client,
+        iterations * 5,
+    )
+    tracing.TRACE_SAMPLE_RATE = 1.0
+    measure("select_img data URLs", lambda: select(messages), plain_client, iterations)
+    measure(
+        "select_img placeholders",
+        lambda: select(messages),
+        redacting_client,
+        iterations,
+    )
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+import argparse
+import sys
+
+from src.pub_img.client import Client
+from src.pub_img.mod import build_dish_index
+from src.shared.config import MetaConfig, load_parameters
+from src.shared.dish_index import DISH_INDEX_BUCKET, DISH_INDEX_KEY
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Rebuild the dish index from published Instagram captions.",
+    )
+    parser.add_argument(
+        "--bucket",
+        default=DISH_INDEX_BUCKET,
+        required=not DISH_INDEX_BUCKET,
+    )
+    parser.add_argument("--key", default=DISH_INDEX_KEY)
+    args = parser.parse_args()
+
+    load_parameters(MetaConfig)
+    index = build_dish_index(Client(MetaConfig()))
+    index.save(args.bucket, args.key)
+    sys.stdout.write(f"Indexed {len(index)} dishes to {args.bucket}/{args.key}\n")
+
+
+if __name__ == "__main__":
+    main()
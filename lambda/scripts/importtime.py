@@ -0,0 +1,88 @@
+import argparse
+import math
+import os
+import subprocess
+import sys
+from dataclasses import dataclass
+
+# Slowest best-of-N cumulative import time of src.<stage>.handler seen across
+# repeated runs and machines. Re-measure when a handler's imports change.
+IMPORT_BASELINES_MS = {
+    "gen_text": 412,
+    "gen_img": 575,
+    "select_img": 586,
+    "edit_img": 485,
+    "pub_img": 710,
+}
+# A fixed margin over the baseline, so one noisy run does not fail the gate.
+IMPORT_MARGIN = 0.25
+IMPORT_BUDGETS_MS = {
+    handler: math.ceil(baseline_ms * (1 + IMPORT_MARGIN) / 10) * 10
+    for handler, baseline_ms in IMPORT_BASELINES_MS.items()
+}
+
+
+@dataclass
+class ImportTime:
+    name: str
+    depth: int
+    cumulative_ms: float
+
+
+def measure(module: str) -> list[ImportTime]:
+    # Prewarm would start importing SDKs in the background and skew the numbers.
+    env = {**os.environ, "PREWARM": "false"}
+    result = subprocess.run(  # noqa: S603
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        env=env,
+        check=True,
+    )
+    times: list[ImportTime] = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        times.append(ImportTime(name.strip(), depth, int(cumulative) / 1000))
+    return times
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Check the import cost of each handler against its budget.",
+    )
+    parser.add_argument("handlers", nargs="*", default=list(IMPORT_BUDGETS_MS))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=5)
+    args = parser.parse_args()
+
+    over_budget = []
+    for handler in args.handlers:
+        module = f"src.{handler}.handler"
+        # The fastest run is the least disturbed by the page cache and the host.
+        runs = [measure(module) for _ in range(args.repeat)]
+        times = min(runs, key=lambda run: run[-1].cumulative_ms)
+        total_ms = times[-1].cumulative_ms
+        budget_ms = IMPORT_BUDGETS_MS[handler]
+        status = "ok" if total_ms <= budget_ms else "OVER"
+        sys.stdout.write(
+            f"{handler:<12}{total_ms:8.1f} ms / {budget_ms} ms budget  {status}\n",
+        )
+        packages = sorted(
+            (t for t in times if t.depth == 1),
+            key=lambda t: t.cumulative_ms,
+            reverse=True,
+        )
+        for package in packages[: args.top]:
+            sys.stdout.write(f"    {package.cumulative_ms:8.1f} ms  {package.name}\n")
+        if total_ms > budget_ms:
+            over_budget.append(handler)
+    if over_budget:
+        sys.stderr.write(f"Import budget exceeded: {', '.join(over_budget)}\n")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import ClassVar
+
+
+class StubOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    content: ClassVar[str] = "{}"
+    latency: ClassVar[float] = 0.0
+    # A fraction of requests stall, to model a provider's latency tail.
+    stall_rate: ClassVar[float] = 0.0
+    stall_latency: ClassVar[float] = 0.0
+    connections: ClassVar[int] = 0
+    requests: ClassVar[int] = 0
+
+    def setup(self) -> None:
+        super().setup()
+        StubOpenAIHandler.connections += 1
+
+    def do_POST(self) -> None:  # noqa: N802
+        length = int(self.headers.get("Content-Length", "0"))
+        request = json.loads(self.rfile.read(length))
+        StubOpenAIHandler.requests += 1
+        stalled = random.random() < self.stall_rate  # noqa: S311
+        time.sleep(self.stall_latency if stalled else self.latency)
+        body = json.dumps(
+            {
+                "id": f"chatcmpl-stub-{self.requests}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", ""),
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {
+                            "role": "assistant",
+                            "content": self.content,
+                            "refusal": None,
+                        },
+                        "finish_reason": "stop",
+                        "logprobs": None,
+                    },
+                ],
+                "usage": {
+                    "prompt_tokens": 1,
+                    "completion_tokens": 1,
+                    "total_tokens": 2,
+                },
+            },
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: object) -> None:  # noqa: A002
+        pass
+
+
+def start_stub_openai() -> tuple[ThreadingHTTPServer, str]:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubOpenAIHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host!s}:{port}/v1"
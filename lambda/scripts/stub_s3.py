@@ -0,0 +1,78 @@
+import hashlib
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import ClassVar
+from urllib.parse import urlsplit
+
+
+class StubS3Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    objects: ClassVar[dict[str, tuple[bytes, dict[str, str]]]] = {}
+    latency: ClassVar[float] = 0.0
+    # Real S3 answers 403 for a missing key unless the caller has s3:ListBucket.
+    missing_status: ClassVar[int] = 404
+
+    def do_PUT(self) -> None:  # noqa: N802
+        length = int(self.headers.get("Content-Length", "0"))
+        body = self.rfile.read(length)
+        headers = {
+            name: value
+            for name, value in self.headers.items()
+            if name.lower() == "content-type" or name.lower().startswith("x-amz-meta-")
+        }
+        self.objects[self._path()] = (body, headers)
+        self.send_response(200)
+        self.send_header("ETag", f'"{hashlib.md5(body).hexdigest()}"')  # noqa: S324
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self) -> None:  # noqa: N802
+        self._send_object(with_body=True)
+
+    def do_HEAD(self) -> None:  # noqa: N802
+        self._send_object(with_body=False)
+
+    def log_message(self, format: str, *args: object) -> None:  # noqa: A002
+        pass
+
+    def _path(self) -> str:
+        return urlsplit(self.path).path
+
+    def _send_object(self, *, with_body: bool) -> None:
+        time.sleep(self.latency)
+        obj = self.objects.get(self._path())
+        if obj is None:
+            self.send_response(self.missing_status)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body, headers = obj
+        etag = f'"{hashlib.md5(body).hexdigest()}"'  # noqa: S324
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        status = 200
+        byte_range = self.headers.get("Range")
+        if byte_range is not None:
+            start, end = byte_range.removeprefix("bytes=").split("-")
+            body = body[int(start) : int(end) + 1]
+            status = 206
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        if with_body:
+            self.wfile.write(body)
+
+
+def start_stub_s3() -> tuple[ThreadingHTTPServer, str]:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubS3Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host!s}:{port}"
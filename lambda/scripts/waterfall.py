@@ -0,0 +1,152 @@
+import argparse
+import json
+import sys
+from collections import defaultdict
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+from typing import Any
+
+from src.shared.logging import TRACE_RECORD_TYPE
+
+type TraceRecord = dict[str, Any]
+
+
+def read_lines(paths: list[Path]) -> Iterator[str]:
+    if not paths:
+        yield from sys.stdin
+        return
+    for path in paths:
+        files = (
+            sorted(p for p in path.rglob("*") if p.is_file())
+            if path.is_dir()
+            else [path]
+        )
+        for file in files:
+            with file.open(errors="replace") as f:
+                yield from f
+
+
+def parse_records(lines: Iterable[str]) -> Iterator[TraceRecord]:
+    # Lines exported from CloudWatch carry a timestamp/stream prefix before the JSON.
+    for line in lines:
+        start = line.find("{")
+        if start < 0:
+            continue
+        try:
+            record = json.loads(line[start:])
+        except json.JSONDecodeError:
+            continue
+        if isinstance(record, dict) and record.get("Type") == TRACE_RECORD_TYPE:
+            yield record
+
+
+def label(record: TraceRecord) -> str:
+    if record.get("Branch") is None:
+        return str(record["Stage"])
+    return f"{record['Stage']}[{record['Branch']}]"
+
+
+def group_stages(records: list[TraceRecord]) -> list[list[TraceRecord]]:
+    stages: dict[str, list[TraceRecord]] = defaultdict(list)
+    for record in records:
+        stages[record["Stage"]].append(record)
+    return sorted(stages.values(), key=lambda group: min(r["Start"] for r in group))
+
+
+def render_bar(start: float, end: float, origin: float, wall: float, width: int) -> str:
+    scale = width / wall if wall > 0 else 0
+    left = int((start - origin) * scale)
+    size = max(1, round((end - start) * scale))
+    return f"|{' ' * left}{'#' * size}".ljust(width + 1) + "|"
+
+
+def render_execution(
+    exec_name: str,
+    records: list[TraceRecord],
+    width: int,
+    *,
+    show_spans: bool,
+) -> str:
+    records = sorted(records, key=lambda r: r["Start"])
+    origin = min(r["Start"] for r in records)
+    wall = max(r["End"] for r in records) - origin
+    lines = [f"== {exec_name}: {len(records)} stages, wall {wall:.2f} s"]
+    name_width = max(len(label(r)) for r in records) + 2
+    for record in records:
+        duration = record["End"] - record["Start"]
+        lines.append(
+            f"{label(record):<{name_width}}{'cold' if record['Cold'] else 'warm'} "
+            f"+{record['Start'] - origin:7.2f} s {duration:7.2f} s "
+            f"{render_bar(record['Start'], record['End'], origin, wall, width)}",
+        )
+        if show_spans:
+            lines.extend(
+                f"{'':<{name_width + 2}}{'  ' * depth}{name} "
+                f"+{offset_ms / 1000:.2f} s {duration_ms / 1000:.2f} s"
+                for name, depth, offset_ms, duration_ms in record["Spans"]
+            )
+
+    lines.append("-- critical path")
+    previous_end = origin
+    stage_times: dict[str, float] = {}
+    for group in group_stages(records):
+        # The branch that finishes last gates the next stage.
+        critical = max(group, key=lambda r: r["End"])
+        gap = min(r["Start"] for r in group) - previous_end
+        stage_times[label(critical)] = critical["End"] - previous_end
+        lines.append(
+            f"{label(critical):<{name_width}}"
+            f"{critical['End'] - critical['Start']:7.2f} s "
+            f"(waited {max(gap, 0):.2f} s before start)",
+        )
+        if len(group) > 1:
+            fastest = min(group, key=lambda r: r["End"])
+            lines.append(
+                f"{'':<{name_width}}slowest of {len(group)} branches, "
+                f"{critical['End'] - fastest['End']:.2f} s after {label(fastest)}",
+            )
+        previous_end = critical["End"]
+    dominant, dominant_time = max(stage_times.items(), key=lambda item: item[1])
+    share = dominant_time / wall * 100 if wall > 0 else 0
+    lines.append(
+        f"-- dominant: {dominant} {dominant_time:.2f} s ({share:.0f}% of wall)",
+    )
+    return "\n".join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Rebuild the per-execution waterfall from log_exec trace records.",
+    )
+    parser.add_argument(
+        "paths",
+        nargs="*",
+        type=Path,
+        help="Files or directories; stdin if omitted.",
+    )
+    parser.add_argument("--exec-name", help="Only show this execution.")
+    parser.add_argument("--width", type=int, default=60)
+    parser.add_argument("--spans", action="store_true", help="Show child spans.")
+    args = parser.parse_args()
+
+    executions: dict[str, list[TraceRecord]] = defaultdict(list)
+    for record in parse_records(read_lines(args.paths)):
+        exec_name = str(record.get("ExecName") or "-")
+        if args.exec_name is None or exec_name == args.exec_name:
+            executions[exec_name].append(record)
+    if not executions:
+        sys.stderr.write("No trace records found.\n")
+        sys.exit(1)
+    ordered = sorted(
+        executions.items(),
+        key=lambda item: min(r["Start"] for r in item[1]),
+    )
+    for exec_name, records in ordered:
+        sys.stdout.write(
+            render_execution(exec_name, records, args.width, show_spans=args.spans)
+            + "\n\n",
+        )
+
+
+if __name__ == "__main__":
+    main()
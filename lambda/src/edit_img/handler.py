@@ -5,10 +5,14 @@ from loguru import logger
 from PIL import Image, ImageDraw, ImageFilter, ImageFont
 from pydantic import BaseModel
 
-from src.shared.logging import log_exec
-from src.shared.s3 import get_image, put_image
+from src.shared import prewarm
+from src.shared.logging import log_exec, span
+from src.shared.s3 import FAST_ENCODING, get_image, put_image
+from src.shared.storage import get_backend
 from src.shared.type import EditImgResponse
 
+_storage = prewarm.register("storage", get_backend)
+
 
 class EditImgArgs(BaseModel):
     bucket_name: str
@@ -70,6 +74,7 @@ def create_title(
     return title_image
 
 
+@span("calc_fontsize")
 def _calc_fontsize(
     draw: ImageDraw.ImageDraw,
     text: str,
@@ -94,22 +99,32 @@ def handler(event: dict[str, Any], context: object) -> EditImgResponse:  # noqa:
 
 @log_exec
 def main(args: EditImgArgs) -> EditImgResponse:
-    image = get_image(args.bucket_name, args.image_key).convert("RGBA")
+    _storage.get()
+    image = get_image(args.bucket_name, args.image_key)
+    with span("rgba_convert"):
+        image = image.convert("RGBA")
     w, h = image.size
     logger.info(f"Image size: width {w} - height {h}")
 
-    blur_image = image.filter(ImageFilter.GaussianBlur(4))
+    with span("gaussian_blur"):
+        blur_image = image.filter(ImageFilter.GaussianBlur(4))
     font_path = "src/edit_img/fonts/Bold.ttf"
-    title_image = create_title(w, h, args.title, font_path)
-    result_image = Image.alpha_composite(blur_image, title_image)
+    with span("create_title"):
+        title_image = create_title(w, h, args.title, font_path)
+    with span("composite"):
+        result_image = Image.alpha_composite(blur_image, title_image)
 
-    title_image_key = put_image(
+    title_meta = put_image(
         result_image,
         args.bucket_name,
         f"{args.exec_name}/0.png",
+        FAST_ENCODING,
+        content_addressed=True,
     )
     return {
-        "TitleImgKey": title_image_key,
+        "TitleImgKey": title_meta["Key"],
+        "TitleImgSize": title_meta["Size"],
+        "TitleImgSha256": title_meta["Sha256"],
     }
 
 
@@ -1,21 +1,49 @@
-from google import genai
-from google.genai import types
-from langsmith import traceable
+from typing import TYPE_CHECKING, Any
+
+from src.shared.tracing import redact, trace_context
+
+if TYPE_CHECKING:
+    from google.genai import types
+
+
+def redact_response(response: object) -> dict[str, Any]:
+    # model_dump keeps inline_data as bytes, so the image is hashed, not encoded.
+    model_dump = getattr(response, "model_dump", None)
+    if model_dump is None:
+        return {"output": redact(response)}
+    outputs: dict[str, Any] = redact(model_dump(exclude_none=True))
+    return outputs
 
 
 class TracedGeminiClient:
     def __init__(self, api_key: str) -> None:
+        # google.genai and langsmith.run_helpers cost ~2 s to import, so they
+        # load with the client instead of with the handler module.
+        from google import genai
+        from langsmith import traceable
+
         self.client = genai.Client(api_key=api_key)
+        self._generate_content: Any = traceable(
+            name="gemini_generate_content",
+            project_name="musabi",
+            process_outputs=redact_response,
+        )(self.client.models.generate_content)
 
-    @traceable(name="gemini_generate_content", project_name="musabi")
     def generate_content(
         self,
         model: str,
         contents: str,
-        config: types.GenerateContentConfig,
-    ) -> types.GenerateContentResponse:
-        return self.client.models.generate_content(
-            model=model,
-            contents=contents,
-            config=config,
-        )
+        config: "types.GenerateContentConfig",
+    ) -> "types.GenerateContentResponse":
+        with trace_context() as sampled:
+            generate = (
+                self._generate_content
+                if sampled
+                else self.client.models.generate_content
+            )
+            response: types.GenerateContentResponse = generate(
+                model=model,
+                contents=contents,
+                config=config,
+            )
+        return response
@@ -1,17 +1,72 @@
+import math
 import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextvars import copy_context
+from functools import partial
 from io import BytesIO
-from typing import Any, Self
+from typing import TYPE_CHECKING, Any, Self
 
-from google.genai import types
 from loguru import logger
 from PIL import Image
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 from src.gen_img.client import TracedGeminiClient
-from src.shared.config import GeminiConfig, LangSmithConfig
-from src.shared.logging import log_exec
-from src.shared.s3 import put_image
-from src.shared.type import GenImgResponse
+from src.gen_img.prompt_cache import (
+    GEN_IMG_CACHE_BUCKET,
+    GEN_IMG_CACHE_ENABLED,
+    CacheEntry,
+    PromptCache,
+    prompt_key,
+)
+from src.shared import prewarm
+from src.shared.config import GeminiConfig, LangSmithConfig, load_parameters
+from src.shared.hedging import Deadline, DeadlineExceededError, remaining_ms
+from src.shared.logging import count, log_exec
+from src.shared.s3 import (
+    ImageEncoding,
+    decode_image,
+    put_all,
+    put_image,
+    put_image_bytes,
+    sniff_image,
+)
+from src.shared.storage import get_backend
+from src.shared.type import GenImgBatchResponse, GenImgResponse, ObjectMeta
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+GEN_IMG_MAX_CONCURRENCY = int(os.getenv("GEN_IMG_MAX_CONCURRENCY", "4"))
+# Empty keeps the bytes Gemini returned; PNG, JPEG or WEBP re-encodes them.
+GEN_IMG_FORMAT = os.getenv("GEN_IMG_FORMAT", "").upper()
+GEN_IMG_ENCODING = (
+    ImageEncoding.model_validate({"format": GEN_IMG_FORMAT}) if GEN_IMG_FORMAT else None
+)
+# Comma separated bounding sizes, e.g. "256,512"; empty writes no thumbnails.
+GEN_IMG_THUMBNAIL_SIZES = [
+    int(size) for size in os.getenv("GEN_IMG_THUMBNAIL_SIZES", "").split(",") if size
+]
+THUMBNAIL_ENCODING = ImageEncoding.model_validate(
+    {
+        "format": os.getenv("GEN_IMG_THUMBNAIL_FORMAT", "WEBP").upper(),
+        "quality": 80,
+    },
+)
+EXTENSIONS = {"PNG": "png", "JPEG": "jpg", "WEBP": "webp"}
+GEN_IMG_MODEL = "gemini-2.0-flash-preview-image-generation"
+# Kept as plain data so the cache key can be built without importing google.genai.
+GEN_IMG_CONFIG = {"response_modalities": ["TEXT", "IMAGE"]}
+
+_secrets = prewarm.register(
+    "secrets",
+    lambda: load_parameters(GeminiConfig, LangSmithConfig),
+)
+_gemini_client = prewarm.register(
+    "gemini_client",
+    lambda: TracedGeminiClient(GeminiConfig().api_key),
+)
+_storage = prewarm.register("storage", get_backend)
 
 
 class GenImgArgs(BaseModel):
@@ -20,6 +75,7 @@ class GenImgArgs(BaseModel):
     ingredients: str
     exec_name: str
     parallel_index: int
+    bypass_cache: bool = False
 
     @classmethod
     def from_event(cls, event: dict[str, Any]) -> Self:
@@ -30,15 +86,47 @@ class GenImgArgs(BaseModel):
                 "ingredients": event.get("Ingredients"),
                 "exec_name": event.get("ExecName"),
                 "parallel_index": event.get("ParallelIndex"),
+                "bypass_cache": event.get("BypassCache", False),
             },
         )
 
 
-def generate_dish_img(client: TracedGeminiClient, contents: str) -> Image.Image:
+class GenImgBatchArgs(BaseModel):
+    bucket_name: str
+    dish_name: str
+    ingredients: str
+    exec_name: str
+    candidate_count: int = Field(ge=1)
+    # Best-effort mode: after budget_seconds, any min_candidate_count are enough.
+    min_candidate_count: int | None = Field(default=None, ge=1)
+    budget_seconds: float | None = Field(default=None, gt=0)
+    remaining_ms: int | None = None
+    bypass_cache: bool = False
+
+    @classmethod
+    def from_event(cls, event: dict[str, Any], context: object = None) -> Self:
+        return cls.model_validate(
+            {
+                "bucket_name": os.getenv("IMAGE_BUCKET"),
+                "dish_name": event.get("DishName"),
+                "ingredients": event.get("Ingredients"),
+                "exec_name": event.get("ExecName"),
+                "candidate_count": event.get("CandidateCount"),
+                "min_candidate_count": event.get("MinCandidateCount"),
+                "budget_seconds": event.get("BudgetSeconds"),
+                "remaining_ms": remaining_ms(context),
+                "bypass_cache": event.get("BypassCache", False),
+            },
+        )
+
+
+def generate_dish_img(client: TracedGeminiClient, contents: str) -> bytes:
+    from google.genai import types
+
     response = client.generate_content(
-        model="gemini-2.0-flash-preview-image-generation",
+        model=GEN_IMG_MODEL,
         contents=contents,
-        config=types.GenerateContentConfig(response_modalities=["TEXT", "IMAGE"]),
+        config=types.GenerateContentConfig.model_validate(GEN_IMG_CONFIG),
     )
     if (
         response.candidates is None
@@ -48,45 +136,306 @@ def generate_dish_img(client: TracedGeminiClient, contents: str) -> Image.Image:
         msg = "Generated image is None."
         raise RuntimeError(msg)
 
-    image = None
+    data = None
     for part in response.candidates[0].content.parts:
         if part.text is not None:
             logger.info(f"Text response: {part.text}")
         elif part.inline_data is not None and part.inline_data.data is not None:
-            image = Image.open(BytesIO(part.inline_data.data))
-    if image is None:
+            data = part.inline_data.data
+    if data is None:
         msg = "Generated image is None."
         raise RuntimeError(msg)
-    return image
+    return data
+
+
+def build_contents(dish_name: str, ingredients: str) -> str:
+    return (
+        f"{dish_name}という料理の写真を生成してください。\n"
+        "写真はおしゃれでモダンな雰囲気でお願いします。\n"
+        "画像のサイズは1024x1024でお願いします。\n"
+        "生成する画像に材料に関する説明文は入れないでください。\n\n"
+        f"参考にする材料情報は次のとおりです。\n{ingredients}"
+    )
+
+
+def generate_dish_imgs(  # noqa: PLR0913
+    client: TracedGeminiClient,
+    contents: str,
+    candidate_count: int,
+    min_count: int | None = None,
+    budget: Deadline | None = None,
+    deadline: Deadline | None = None,
+) -> dict[int, bytes]:
+    min_count = (
+        candidate_count if min_count is None else min(min_count, candidate_count)
+    )
+    budget = budget or Deadline()
+    deadline = deadline or Deadline()
+    # The SDK call blocks on network I/O, so threads overlap the candidates.
+    executor = ThreadPoolExecutor(
+        min(candidate_count, GEN_IMG_MAX_CONCURRENCY),
+        thread_name_prefix="gen-img",
+    )
+    futures = {
+        executor.submit(copy_context().run, generate_dish_img, client, contents): i
+        for i in range(candidate_count)
+    }
+    pending = set(futures)
+    images: dict[int, bytes] = {}
+    errors: list[BaseException] = []
+    try:
+        while pending:
+            # Until min_count candidates are in, only the hard deadline applies.
+            until = budget if len(images) >= min_count else deadline
+            timeout = until.remaining()
+            if timeout <= 0:
+                if until is budget:
+                    break
+                msg = f"Only {len(images)} of {min_count} candidates before deadline."
+                raise DeadlineExceededError(msg)
+            done, pending = wait(
+                pending,
+                timeout=None if math.isinf(timeout) else timeout,
+                return_when=FIRST_COMPLETED,
+            )
+            for future in done:
+                error = future.exception()
+                if error is not None:
+                    logger.error(
+                        f"Failed to generate candidate {futures[future]}: {error!s}",
+                    )
+                    errors.append(error)
+                    continue
+                images[futures[future]] = future.result()
+            if candidate_count - len(errors) < min_count:
+                raise errors[0]
+    finally:
+        # Stragglers are left to finish on their own; their results are dropped.
+        executor.shutdown(wait=False, cancel_futures=True)
+    if pending:
+        count("gen_img_straggler", len(pending))
+        logger.info(
+            f"Dropped candidates {sorted(futures[f] for f in pending)} after budget",
+        )
+    return dict(sorted(images.items()))
+
 
+def derive_thumbnails(image: Image.Image) -> list[tuple[int, Image.Image]]:
+    thumbnails: list[tuple[int, Image.Image]] = []
+    # Each size is reduced from the previous one, so the full image is read once.
+    for size in sorted(GEN_IMG_THUMBNAIL_SIZES, reverse=True):
+        image = image.copy()
+        image.thumbnail((size, size))
+        thumbnails.append((size, image))
+    return thumbnails
 
-def handler(event: dict[str, Any], context: object) -> GenImgResponse:  # noqa: ARG001
+
+def _keys(results: list[ObjectMeta | BaseException]) -> list[str]:
+    keys: list[str] = []
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+        keys.append(result["Key"])
+    return keys
+
+
+def store_images(
+    images: list[bytes],
+    bucket_name: str,
+    key_stems: list[str],
+) -> tuple[list[str], dict[str, list[str]]]:
+    originals: list[Callable[[], ObjectMeta]] = []
+    thumbnails: list[Callable[[], ObjectMeta]] = []
+    thumbnail_sizes: list[int] = []
+    for data, stem in zip(images, key_stems, strict=True):
+        image = None
+        if GEN_IMG_ENCODING is None:
+            # The header tells the format, so the bytes go up without a decode.
+            extension = EXTENSIONS[sniff_image(data)["Format"]]
+            originals.append(
+                partial(put_image_bytes, data, bucket_name, f"{stem}.{extension}"),
+            )
+        else:
+            image = decode_image(BytesIO(data))
+            extension = EXTENSIONS[GEN_IMG_ENCODING.format]
+            originals.append(
+                partial(
+                    put_image,
+                    image,
+                    bucket_name,
+                    f"{stem}.{extension}",
+                    GEN_IMG_ENCODING,
+                ),
+            )
+        if not GEN_IMG_THUMBNAIL_SIZES:
+            continue
+        if image is None:
+            image = decode_image(BytesIO(data), max(GEN_IMG_THUMBNAIL_SIZES))
+        extension = EXTENSIONS[THUMBNAIL_ENCODING.format]
+        for size, thumbnail in derive_thumbnails(image):
+            thumbnails.append(
+                partial(
+                    put_image,
+                    thumbnail,
+                    bucket_name,
+                    f"{stem}-{size}.{extension}",
+                    THUMBNAIL_ENCODING,
+                ),
+            )
+            thumbnail_sizes.append(size)
+    # Thumbnails upload alongside the originals instead of after them.
+    results = put_all(originals + thumbnails)
+    keys = _keys(results[: len(originals)])
+    thumbnail_keys: dict[str, list[str]] = {}
+    for size, key in zip(
+        thumbnail_sizes,
+        _keys(results[len(originals) :]),
+        strict=True,
+    ):
+        thumbnail_keys.setdefault(str(size), []).append(key)
+    return keys, thumbnail_keys
+
+
+def handler(
+    event: dict[str, Any],
+    context: object,
+) -> GenImgResponse | GenImgBatchResponse:
+    # CandidateCount selects the in-process fan-out; otherwise one image per index.
+    if event.get("CandidateCount") is not None:
+        return main_batch(GenImgBatchArgs.from_event(event, context))
     return main(GenImgArgs.from_event(event))
 
 
+def setup_clients() -> TracedGeminiClient:
+    _secrets.get()
+    LangSmithConfig().setup_env()
+    client = _gemini_client.get()
+    _storage.get()
+    return client
+
+
+def cache_key(contents: str) -> str:
+    # Output settings are part of the key, so a hit has the same format and sizes.
+    return prompt_key(
+        model=GEN_IMG_MODEL,
+        contents=contents,
+        config=GEN_IMG_CONFIG,
+        format=GEN_IMG_FORMAT,
+        thumbnail_sizes=sorted(GEN_IMG_THUMBNAIL_SIZES),
+        thumbnail_format=THUMBNAIL_ENCODING.format,
+    )
+
+
+def lookup_cache(
+    cache: PromptCache,
+    key: str,
+    slots: list[int],
+    *,
+    bypass: bool,
+) -> dict[int, CacheEntry]:
+    if not GEN_IMG_CACHE_ENABLED or bypass:
+        return {}
+    return cache.get_many(key, slots)
+
+
+def to_entries(
+    slots: list[int],
+    image_keys: list[str],
+    thumbnail_keys: dict[str, list[str]],
+) -> dict[int, CacheEntry]:
+    created_at = time.time()
+    entries: dict[int, CacheEntry] = {}
+    for i, (slot, image_key) in enumerate(zip(slots, image_keys, strict=True)):
+        entry: CacheEntry = {"CreatedAt": created_at, "ImgKey": image_key}
+        if thumbnail_keys:
+            entry["Thumbnails"] = {
+                size: keys[i] for size, keys in thumbnail_keys.items()
+            }
+        entries[slot] = entry
+    return entries
+
+
+def save_cache(cache: PromptCache, key: str, entries: dict[int, CacheEntry]) -> None:
+    # Bypass still writes, so a forced run refreshes the cached images.
+    if GEN_IMG_CACHE_ENABLED:
+        cache.put_many(key, entries)
+
+
 @log_exec
 def main(
     args: GenImgArgs,
 ) -> GenImgResponse:
-    config = GeminiConfig()
-    LangSmithConfig().setup_env()
-    client = TracedGeminiClient(config.api_key)
-    contents = (
-        f"{args.dish_name}という料理の写真を生成してください。\n"
-        "写真はおしゃれでモダンな雰囲気でお願いします。\n"
-        "画像のサイズは1024x1024でお願いします。\n"
-        "生成する画像に材料に関する説明文は入れないでください。\n\n"
-        f"参考にする材料情報は次のとおりです。\n{args.ingredients}"
-    )
-    image = generate_dish_img(client, contents)
-    img_key = put_image(
-        image,
-        args.bucket_name,
-        f"{args.exec_name}/1-{args.parallel_index}.png",
-    )
-    return {
-        "ImgKey": img_key,
+    _storage.get()
+    contents = build_contents(args.dish_name, args.ingredients)
+    cache = PromptCache(GEN_IMG_CACHE_BUCKET or args.bucket_name)
+    key = cache_key(contents)
+    slot = args.parallel_index
+    entries = lookup_cache(cache, key, [slot], bypass=args.bypass_cache)
+    if slot not in entries:
+        client = setup_clients()
+        image = generate_dish_img(client, contents)
+        image_keys, thumbnail_keys = store_images(
+            [image],
+            args.bucket_name,
+            [f"{args.exec_name}/1-{slot}"],
+        )
+        entries = to_entries([slot], image_keys, thumbnail_keys)
+        save_cache(cache, key, entries)
+    entry = entries[slot]
+    response: GenImgResponse = {
+        "ImgKey": entry["ImgKey"],
+    }
+    if "Thumbnails" in entry:
+        response["Thumbnails"] = entry["Thumbnails"]
+    return response
+
+
+@log_exec
+def main_batch(args: GenImgBatchArgs) -> GenImgBatchResponse:
+    _storage.get()
+    contents = build_contents(args.dish_name, args.ingredients)
+    cache = PromptCache(GEN_IMG_CACHE_BUCKET or args.bucket_name)
+    key = cache_key(contents)
+    slots = list(range(args.candidate_count))
+    entries = lookup_cache(cache, key, slots, bypass=args.bypass_cache)
+    missing = [slot for slot in slots if slot not in entries]
+    if missing:
+        client = setup_clients()
+        min_count = (
+            None
+            if args.min_candidate_count is None
+            else max(0, args.min_candidate_count - len(entries))
+        )
+        images = generate_dish_imgs(
+            client,
+            contents,
+            len(missing),
+            min_count,
+            Deadline.after(args.budget_seconds),
+            Deadline.from_remaining_ms(args.remaining_ms),
+        )
+        generated = [missing[i] for i in images]
+        # Same keys as the per-index mode, so SelectImg and EditImg see no difference.
+        image_keys, thumbnail_keys = store_images(
+            list(images.values()),
+            args.bucket_name,
+            [f"{args.exec_name}/1-{slot}" for slot in generated],
+        )
+        new_entries = to_entries(generated, image_keys, thumbnail_keys)
+        save_cache(cache, key, new_entries)
+        entries = dict(sorted({**entries, **new_entries}.items()))
+    response: GenImgBatchResponse = {
+        "ImageKeys": [entry["ImgKey"] for entry in entries.values()],
+        "Indices": list(entries),
     }
+    thumbnails = [
+        entry["Thumbnails"] for entry in entries.values() if "Thumbnails" in entry
+    ]
+    if thumbnails:
+        response["Thumbnails"] = {
+            size: [t[size] for t in thumbnails] for size in thumbnails[0]
+        }
+    return response
 
 
 if __name__ == "__main__":
@@ -0,0 +1,109 @@
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from functools import cache
+from typing import NotRequired, TypedDict
+
+from loguru import logger
+
+from src.shared.logging import count, span
+from src.shared.storage import get_backend
+
+GEN_IMG_CACHE_ENABLED = os.getenv("GEN_IMG_CACHE", "true").lower() == "true"
+# Defaults to the image bucket, where the cached keys point.
+GEN_IMG_CACHE_BUCKET = os.getenv("GEN_IMG_CACHE_BUCKET", "")
+GEN_IMG_CACHE_PREFIX = os.getenv("GEN_IMG_CACHE_PREFIX", "gen-img-cache")
+GEN_IMG_CACHE_TTL_SECONDS = float(
+    os.getenv("GEN_IMG_CACHE_TTL_SECONDS", str(7 * 24 * 60 * 60)),
+)
+GEN_IMG_CACHE_MAX_WORKERS = 8
+
+
+class CacheEntry(TypedDict):
+    CreatedAt: float
+    ImgKey: str
+    Thumbnails: NotRequired[dict[str, str]]
+
+
+@cache
+def _get_executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(
+        max_workers=GEN_IMG_CACHE_MAX_WORKERS,
+        thread_name_prefix="cache",
+    )
+
+
+def prompt_key(**parts: object) -> str:
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class PromptCache:
+    def __init__(
+        self,
+        bucket_name: str,
+        prefix: str = GEN_IMG_CACHE_PREFIX,
+        ttl_seconds: float = GEN_IMG_CACHE_TTL_SECONDS,
+    ) -> None:
+        self.bucket_name = bucket_name
+        self.prefix = prefix
+        self.ttl_seconds = ttl_seconds
+
+    def _key(self, prompt: str, slot: int) -> str:
+        # One object per candidate slot, so per-index invocations never race.
+        return f"{self.prefix}/{prompt}/{slot}.json"
+
+    def get(self, prompt: str, slot: int) -> CacheEntry | None:
+        response = get_backend().find(self.bucket_name, self._key(prompt, slot))
+        if response is None:
+            count("gen_img_cache_miss")
+            return None
+        entry: CacheEntry = json.loads(b"".join(response["Body"]))
+        if time.time() - entry["CreatedAt"] > self.ttl_seconds:
+            count("gen_img_cache_miss")
+            return None
+        count("gen_img_cache_hit")
+        return entry
+
+    def put(self, prompt: str, slot: int, entry: CacheEntry) -> None:
+        get_backend().put(
+            self.bucket_name,
+            self._key(prompt, slot),
+            json.dumps(entry).encode(),
+            "application/json",
+            {},
+        )
+
+    def get_many(self, prompt: str, slots: list[int]) -> dict[int, CacheEntry]:
+        executor = _get_executor()
+        with span("gen_img_cache.get"):
+            futures = [
+                executor.submit(copy_context().run, self.get, prompt, slot)
+                for slot in slots
+            ]
+            errors = [future.exception() for future in futures]
+        entries: dict[int, CacheEntry] = {}
+        for slot, future, error in zip(slots, futures, errors, strict=True):
+            if error is not None:
+                logger.warning(f"Failed to read cache slot {slot}: {error!s}")
+                count("gen_img_cache_miss")
+                continue
+            entry = future.result()
+            if entry is not None:
+                entries[slot] = entry
+        return entries
+
+    def put_many(self, prompt: str, entries: dict[int, CacheEntry]) -> None:
+        executor = _get_executor()
+        futures = {
+            slot: executor.submit(copy_context().run, self.put, prompt, slot, entry)
+            for slot, entry in entries.items()
+        }
+        for slot, future in futures.items():
+            error = future.exception()
+            # The images are already stored, so a failed cache write only costs a miss.
+            if error is not None:
+                logger.warning(f"Failed to write cache slot {slot}: {error!s}")
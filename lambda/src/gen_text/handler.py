@@ -1,14 +1,76 @@
+import os
 import random
-from typing import Any
+from functools import cache
+from typing import TYPE_CHECKING, Any, Self
 
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
-from pydantic import BaseModel, Field
+from loguru import logger
+from pydantic import BaseModel, ConfigDict, Field
 
-from src.shared.config import LangSmithConfig, OpenAIConfig
-from src.shared.logging import log_exec
+from src.gen_text.pool import (
+    RECIPE_POOL_BUCKET,
+    RECIPE_POOL_TARGET,
+    GenerateParams,
+    RecipePool,
+)
+from src.shared import prewarm
+from src.shared.config import LangSmithConfig, OpenAIConfig, load_parameters
+from src.shared.dish_index import (
+    DISH_INDEX_BUCKET,
+    DishIndex,
+    DishMatch,
+    parse_ingredients,
+)
+from src.shared.hedging import (
+    HEDGE_DEFAULT_DELAY_SECONDS,
+    Deadline,
+    LatencyTracker,
+    hedged_call,
+    remaining_ms,
+)
+from src.shared.logging import count, log_exec
+from src.shared.storage import get_backend
 from src.shared.type import GenTextResponse
 
+if TYPE_CHECKING:
+    import httpx
+    from langchain_core.runnables import Runnable
+
+OPENAI_TIMEOUT_SECONDS = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "120"))
+OPENAI_KEEPALIVE_SECONDS = float(os.getenv("OPENAI_KEEPALIVE_SECONDS", "60"))
+DISH_MAX_REGENERATIONS = int(os.getenv("DISH_MAX_REGENERATIONS", "2"))
+LATENCY_BUCKET = os.getenv("LATENCY_BUCKET", "")
+LATENCY_KEY = os.getenv("LATENCY_KEY", "latency/generate_dish.json")
+
+
+class GenTextArgs(BaseModel):
+    exec_name: str | None = None
+    remaining_ms: int | None = None
+
+    @classmethod
+    def from_event(cls, event: dict[str, Any], context: object = None) -> Self:
+        return cls.model_validate(
+            {
+                "exec_name": event.get("ExecName"),
+                "remaining_ms": remaining_ms(context),
+            },
+        )
+
+
+class RefillArgs(BaseModel):
+    bucket_name: str
+    target: int
+    remaining_ms: int | None = None
+
+    @classmethod
+    def from_event(cls, event: dict[str, Any], context: object = None) -> Self:
+        return cls.model_validate(
+            {
+                "bucket_name": RECIPE_POOL_BUCKET,
+                "target": event.get("Target", RECIPE_POOL_TARGET),
+                "remaining_ms": remaining_ms(context),
+            },
+        )
+
 
 class Dish(BaseModel):
     dish_name: str = Field(description="料理の名前")
@@ -24,7 +86,63 @@ class Dish(BaseModel):
         return f"【作り方】\n{'\n'.join(steps)}"
 
 
-def get_generate_params() -> tuple[str, str, str]:
+class ModelParams(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
+    model: str = "gpt-4.1"
+    temperature: float = 0.8
+    top_p: float = 0.8
+    frequency_penalty: float = 0.5
+    presence_penalty: float = 0.8
+
+
+DEFAULT_MODEL_PARAMS = ModelParams()
+
+
+@cache
+def get_http_client() -> "httpx.Client":
+    import httpx
+
+    return httpx.Client(
+        timeout=httpx.Timeout(OPENAI_TIMEOUT_SECONDS, connect=10.0),
+        limits=httpx.Limits(keepalive_expiry=OPENAI_KEEPALIVE_SECONDS),
+    )
+
+
+@cache
+def get_chain(params: ModelParams) -> "Runnable[dict[str, str], Any]":
+    # langchain_openai alone is ~1 s of import, so keep it off the module path.
+    from langchain_core.prompts import ChatPromptTemplate
+    from langchain_openai import ChatOpenAI
+
+    # The message is a template variable, so the chain is built once per params.
+    prompt = ChatPromptTemplate.from_messages([("human", "{message}")])
+    # Retries are left to hedged_call, which knows the invocation deadline.
+    model = ChatOpenAI(
+        **params.model_dump(),
+        http_client=get_http_client(),
+        max_retries=0,
+    )
+    return prompt | model.with_structured_output(Dish)
+
+
+def _build_chain() -> "Runnable[dict[str, str], Any]":
+    _secrets.get()
+    OpenAIConfig().setup_env()
+    return get_chain(DEFAULT_MODEL_PARAMS)
+
+
+# Storage goes first so a pool hit does not wait on the model.
+_storage = prewarm.register("storage", get_backend)
+_secrets = prewarm.register(
+    "secrets",
+    lambda: load_parameters(OpenAIConfig, LangSmithConfig),
+)
+_chain = prewarm.register("chain", _build_chain)
+_latency = LatencyTracker(HEDGE_DEFAULT_DELAY_SECONDS)
+
+
+def get_generate_params() -> GenerateParams:
     genres = random.choice(["和食", "洋食", "中華料理", "エスニック"])  # noqa: S311
     main_food = random.choice(  # noqa: S311
         [
@@ -53,34 +171,83 @@ def get_message(genres: str, main_food: str, theme: str) -> str:
 """
 
 
-def generate_dish(message: str) -> Dish:
-    prompt = ChatPromptTemplate.from_messages(
-        [
-            ("human", message),
-        ],
-    )
-    model = ChatOpenAI(
-        model="gpt-4.1",
-        temperature=0.8,
-        top_p=0.8,
-        frequency_penalty=0.5,
-        presence_penalty=0.8,
+def generate_dish(
+    message: str,
+    params: ModelParams = DEFAULT_MODEL_PARAMS,
+    deadline: Deadline | None = None,
+) -> Dish:
+    chain = _chain.get() if params == DEFAULT_MODEL_PARAMS else get_chain(params)
+    dish: Dish = hedged_call(
+        lambda: chain.invoke({"message": message}),
+        deadline or Deadline(),
+        _latency,
+        "generate_dish",
     )
-    chain = prompt | model.with_structured_output(Dish)
-    return chain.invoke({})  # type: ignore[return-value]
+    return dish
 
 
-def handler(event: dict[str, Any], context: object) -> GenTextResponse:  # noqa: ARG001
-    return main()
+def load_latency() -> None:
+    if not LATENCY_BUCKET:
+        return
+    try:
+        _latency.load(LATENCY_BUCKET, LATENCY_KEY)
+    except Exception as e:  # noqa: BLE001
+        # Hedging falls back to HEDGE_DEFAULT_DELAY_SECONDS until samples load.
+        logger.warning(f"Failed to load latency samples: {e!s}")
 
 
-@log_exec
-def main() -> GenTextResponse:
-    OpenAIConfig().setup_env()
-    LangSmithConfig().setup_env()
-    genres, main_food, theme = get_generate_params()
-    recipe = generate_dish(get_message(genres, main_food, theme))
-    return {
+def save_latency() -> None:
+    if not LATENCY_BUCKET:
+        return
+    try:
+        _latency.save(LATENCY_BUCKET, LATENCY_KEY)
+    except Exception as e:  # noqa: BLE001
+        logger.warning(f"Failed to save latency samples: {e!s}")
+
+
+def load_dish_index() -> DishIndex | None:
+    if not DISH_INDEX_BUCKET:
+        return None
+    try:
+        return DishIndex.load(DISH_INDEX_BUCKET)
+    except Exception as e:  # noqa: BLE001
+        # Without the index duplicates slip through, which beats failing the run.
+        logger.error(f"Failed to load the dish index: {e!s}")
+        return None
+
+
+def find_duplicate(
+    index: DishIndex | None,
+    dish_name: str,
+    ingredients: list[str],
+) -> DishMatch | None:
+    if index is None:
+        return None
+    match = index.query(dish_name, ingredients)
+    if match is not None:
+        count("dish_duplicate")
+        logger.warning(
+            f"{dish_name} is similar to {match['Name']} "
+            f"({match['Similarity']:.2f}), skip it.",
+        )
+    return match
+
+
+def _generate_checked(
+    params: GenerateParams,
+    index: DishIndex | None,
+    deadline: Deadline | None,
+) -> tuple[GenTextResponse, DishMatch | None]:
+    genres, main_food, theme = params
+    message = get_message(genres, main_food, theme)
+    # The first attempt plus DISH_MAX_REGENERATIONS retries, each one checked.
+    for _ in range(DISH_MAX_REGENERATIONS + 1):
+        recipe = generate_dish(message, deadline=deadline)
+        match = find_duplicate(index, recipe.dish_name, recipe.ingredients)
+        if match is None:
+            break
+        message += f"「{match['Name']}」とは異なる料理にしてください。\n"
+    response: GenTextResponse = {
         "DishName": recipe.dish_name,
         "Genres": genres,
         "MainFood": main_food,
@@ -88,7 +255,109 @@ def main() -> GenTextResponse:
         "Ingredients": recipe.ingredients_str(),
         "Steps": recipe.steps_str(),
     }
+    return response, match
+
+
+def generate_recipe(
+    params: GenerateParams,
+    index: DishIndex | None = None,
+    deadline: Deadline | None = None,
+) -> GenTextResponse:
+    recipe, match = _generate_checked(params, index, deadline)
+    if match is not None:
+        # Another call would cost as much and be just as unchecked.
+        logger.warning(
+            f"Still similar after {DISH_MAX_REGENERATIONS} retries, keep the last",
+        )
+    return recipe
+
+
+def generate_unique_recipe(
+    params: GenerateParams,
+    index: DishIndex | None = None,
+    deadline: Deadline | None = None,
+) -> GenTextResponse | None:
+    recipe, match = _generate_checked(params, index, deadline)
+    if match is not None:
+        # A pooled duplicate would only be discarded again when it is popped.
+        count("dish_duplicate_dropped")
+        logger.warning(
+            f"Still similar after {DISH_MAX_REGENERATIONS} retries, drop it",
+        )
+        return None
+    return recipe
+
+
+def pop_pooled_recipe(
+    pool: RecipePool,
+    index: DishIndex | None,
+) -> GenTextResponse | None:
+    try:
+        while (recipe := pool.pop()) is not None:
+            ingredients = parse_ingredients(recipe["Ingredients"])
+            if find_duplicate(index, recipe["DishName"], ingredients) is None:
+                count("recipe_pool_hit")
+                return recipe
+    except Exception as e:  # noqa: BLE001
+        # An unreadable pool only costs the live fallback, never the run.
+        logger.error(f"Failed to read recipe pool: {e!s}")
+    count("recipe_pool_miss")
+    logger.warning("Recipe pool is empty. Generate a recipe live.")
+    return None
+
+
+def setup_env() -> None:
+    _secrets.get()
+    OpenAIConfig().setup_env()
+    LangSmithConfig().setup_env()
+
+
+def handler(event: dict[str, Any], context: object) -> GenTextResponse:
+    return main(GenTextArgs.from_event(event, context))
+
+
+def refill_handler(
+    event: dict[str, Any],
+    context: object,
+) -> dict[str, int]:
+    return refill(RefillArgs.from_event(event, context))
+
+
+@log_exec
+def main(args: GenTextArgs) -> GenTextResponse:
+    deadline = Deadline.from_remaining_ms(args.remaining_ms)
+    _storage.get()
+    index = load_dish_index()
+    if RECIPE_POOL_BUCKET:
+        recipe = pop_pooled_recipe(RecipePool(RECIPE_POOL_BUCKET), index)
+        if recipe is not None:
+            return recipe
+    setup_env()
+    load_latency()
+    try:
+        return generate_recipe(get_generate_params(), index, deadline)
+    finally:
+        save_latency()
+
+
+@log_exec
+def refill(args: RefillArgs) -> dict[str, int]:
+    deadline = Deadline.from_remaining_ms(args.remaining_ms)
+    _storage.get()
+    setup_env()
+    index = load_dish_index()
+    pool = RecipePool(args.bucket_name)
+    load_latency()
+    try:
+        generated = pool.refill(
+            lambda params: generate_unique_recipe(params, index, deadline),
+            get_generate_params,
+            args.target,
+        )
+    finally:
+        save_latency()
+    return {"Generated": generated}
 
 
 if __name__ == "__main__":
-    main()
+    main(GenTextArgs())
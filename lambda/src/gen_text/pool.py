@@ -0,0 +1,110 @@
+import json
+import os
+import random
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+
+from loguru import logger
+
+from src.shared.dish_index import DishIndex, parse_ingredients
+from src.shared.logging import count, span
+from src.shared.storage import get_backend
+from src.shared.type import GenTextResponse
+
+RECIPE_POOL_BUCKET = os.getenv("RECIPE_POOL_BUCKET", "")
+RECIPE_POOL_KEY = os.getenv("RECIPE_POOL_KEY", "recipe-pool/pool.json")
+RECIPE_POOL_TARGET = int(os.getenv("RECIPE_POOL_TARGET", "8"))
+RECIPE_POOL_CONCURRENCY = int(os.getenv("RECIPE_POOL_CONCURRENCY", "4"))
+# Bounds the search for unused combinations when most of them are pooled.
+MAX_PARAMS_ATTEMPTS = 100
+
+type GenerateParams = tuple[str, str, str]
+
+
+class RecipePool:
+    def __init__(self, bucket_name: str, key: str = RECIPE_POOL_KEY) -> None:
+        self.bucket_name = bucket_name
+        self.key = key
+
+    def load(self) -> list[GenTextResponse]:
+        response = get_backend().find(self.bucket_name, self.key)
+        if response is None:
+            return []
+        recipes: list[GenTextResponse] = json.loads(b"".join(response["Body"]))
+        return recipes
+
+    def save(self, recipes: list[GenTextResponse]) -> None:
+        get_backend().put(
+            self.bucket_name,
+            self.key,
+            json.dumps(recipes, ensure_ascii=False).encode(),
+            "application/json",
+            {},
+        )
+
+    def pop(self) -> GenTextResponse | None:
+        with span("recipe_pool.pop"):
+            recipes = self.load()
+            if not recipes:
+                return None
+            recipe = recipes.pop(random.randrange(len(recipes)))  # noqa: S311
+            self.save(recipes)
+        logger.info(f"Popped {recipe['DishName']}, {len(recipes)} recipes left")
+        return recipe
+
+    def refill(
+        self,
+        generate: Callable[[GenerateParams], GenTextResponse | None],
+        get_params: Callable[[], GenerateParams],
+        target: int = RECIPE_POOL_TARGET,
+        concurrency: int = RECIPE_POOL_CONCURRENCY,
+    ) -> int:
+        recipes = self.load()
+        pooled = {(r["Genres"], r["MainFood"], r["Theme"]) for r in recipes}
+        params: set[GenerateParams] = set()
+        for _ in range(MAX_PARAMS_ATTEMPTS):
+            if len(params) >= target - len(recipes):
+                break
+            candidate = get_params()
+            if candidate not in pooled:
+                params.add(candidate)
+        if not params:
+            return 0
+        candidates = list(params)
+        with ThreadPoolExecutor(concurrency, thread_name_prefix="refill") as executor:
+            futures = [
+                executor.submit(copy_context().run, generate, candidate)
+                for candidate in candidates
+            ]
+        # Recipes generated concurrently never saw each other or the pool.
+        batch = DishIndex()
+        for pooled_recipe in recipes:
+            batch.add(
+                pooled_recipe["DishName"],
+                parse_ingredients(pooled_recipe["Ingredients"]),
+            )
+        generated: list[GenTextResponse] = []
+        for candidate, future in zip(candidates, futures, strict=True):
+            error = future.exception()
+            if error is not None:
+                logger.error(f"Failed to generate recipe for {candidate}: {error!s}")
+                continue
+            recipe = future.result()
+            # Still a duplicate of a published dish after every retry.
+            if recipe is None:
+                continue
+            ingredients = parse_ingredients(recipe["Ingredients"])
+            match = batch.query(recipe["DishName"], ingredients)
+            if match is not None:
+                count("recipe_pool_duplicate")
+                logger.warning(
+                    f"{recipe['DishName']} is similar to pooled {match['Name']}, "
+                    "drop it.",
+                )
+                continue
+            batch.add(recipe["DishName"], ingredients)
+            generated.append(recipe)
+        # Re-read so recipes popped during generation are not put back.
+        self.save(self.load() + generated)
+        return len(generated)
@@ -29,9 +29,9 @@ class Client:
     def __init__(self, config: MetaConfig) -> None:
         self.config = config
 
-    def get_user_media(self) -> dict[str, Any]:
+    def get_user_media(self, after: str | None = None) -> dict[str, Any]:
         url = self.config.endpoint_base + self.config.account_id + "/media"
-        request = {
+        request: dict[str, Any] = {
             "access_token": self.config.access_token,
             "fields": create_fields(
                 [
@@ -46,6 +46,8 @@ class Client:
                 ],
             ),
         }
+        if after is not None:
+            request["after"] = after
         return call_api(url, "GET", request)
 
     def get_media(self, media_id: str) -> dict[str, Any]:
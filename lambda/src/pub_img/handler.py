@@ -6,8 +6,14 @@ from pydantic import BaseModel
 
 from src.pub_img import mod
 from src.pub_img.client import Client
-from src.shared.config import MetaConfig
+from src.shared import prewarm
+from src.shared.config import MetaConfig, load_parameters
+from src.shared.dish_index import DISH_INDEX_BUCKET, DishIndex, parse_ingredients
 from src.shared.logging import log_exec
+from src.shared.storage import get_backend
+
+_secrets = prewarm.register("secrets", lambda: load_parameters(MetaConfig))
+_storage = prewarm.register("storage", get_backend)
 
 
 class PubImgArgs(BaseModel):
@@ -21,6 +27,7 @@ class PubImgArgs(BaseModel):
     ingredients: str
     steps: str
     dry_run: bool
+    exec_name: str | None = None
 
     @classmethod
     def from_event(cls, event: dict[str, Any]) -> Self:
@@ -36,6 +43,7 @@ class PubImgArgs(BaseModel):
                 "ingredients": event.get("Ingredients"),
                 "steps": event.get("Steps"),
                 "dry_run": event.get("DryRun", False),
+                "exec_name": event.get("ExecName"),
             },
         )
 
@@ -49,6 +57,8 @@ def main(args: PubImgArgs) -> dict[str, Any]:
     if args.dry_run:
         logger.info(f"DryRun: {args.dry_run}. Finish no pub image.")
         return {}
+    _secrets.get()
+    _storage.get()
     client = Client(MetaConfig())
     image_url = mod.create_presigned_url(
         args.image_bucket,
@@ -62,9 +72,21 @@ def main(args: PubImgArgs) -> dict[str, Any]:
         image_url=image_url,
         caption=f"\n{args.dish_name}\n\n{comments}\n\n{recipe}\n\n{hashtag}",
     )
+    if DISH_INDEX_BUCKET:
+        add_to_dish_index(args.dish_name, args.ingredients)
     return {}
 
 
+def add_to_dish_index(dish_name: str, ingredients: str) -> None:
+    # The post is already live, so a failed index update must not fail the run.
+    try:
+        index = DishIndex.load(DISH_INDEX_BUCKET)
+        index.add(dish_name, parse_ingredients(ingredients))
+        index.save(DISH_INDEX_BUCKET)
+    except Exception as e:  # noqa: BLE001
+        logger.error(f"Failed to add {dish_name} to the dish index: {e!s}")
+
+
 if __name__ == "__main__":
     main(
         PubImgArgs(
@@ -1,12 +1,13 @@
 import time
-from typing import cast
+from collections.abc import Iterator
+from typing import Any, cast
 
-import boto3
-import botocore
 from botocore.exceptions import ClientError
 from loguru import logger
 
 from src.pub_img.client import Client
+from src.shared.dish_index import INGREDIENTS_HEADER, DishIndex
+from src.shared.storage import get_backend
 
 
 def upload_image(client: Client, image_url: str, caption: str) -> None:
@@ -83,18 +84,47 @@ def create_presigned_url(
     object_name: str,
     expiration: int = 300,
 ) -> str:
-    s3_client = boto3.client(
-        "s3",
-        config=botocore.client.Config(signature_version="s3v4"),
-    )
     try:
-        url: str = s3_client.generate_presigned_url(
-            "get_object",
-            Params={"Bucket": bucket_name, "Key": object_name},
-            ExpiresIn=expiration,
-        )
+        url = get_backend().presigned_url(bucket_name, object_name, expiration)
     except ClientError:
         logger.info("Fail to generate Presigned-URL")
         raise
     logger.info(f"Generated URL: {url}")
     return url
+
+
+def iter_user_media(client: Client) -> Iterator[dict[str, Any]]:
+    after = None
+    while True:
+        response = client.get_user_media(after=after)
+        yield from response.get("data", [])
+        paging = response.get("paging", {})
+        if "next" not in paging:
+            return
+        after = paging["cursors"]["after"]
+
+
+def parse_caption(caption: str) -> tuple[str, list[str]] | None:
+    # Inverse of the caption built in handler.main: the dish name comes first,
+    # then "【材料】" and "- " lines up to the next blank line.
+    lines = caption.strip().splitlines()
+    if not lines or INGREDIENTS_HEADER not in lines:
+        return None
+    start = lines.index(INGREDIENTS_HEADER) + 1
+    ingredients = []
+    for line in lines[start:]:
+        if not line.strip():
+            break
+        ingredients.append(line)
+    return lines[0], ingredients
+
+
+def build_dish_index(client: Client) -> DishIndex:
+    index = DishIndex()
+    for media in iter_user_media(client):
+        parsed = parse_caption(media.get("caption", ""))
+        if parsed is None:
+            logger.info(f"Skip media {media.get('id')} without a recipe caption")
+            continue
+        index.add(*parsed)
+    return index
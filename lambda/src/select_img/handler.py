@@ -1,17 +1,39 @@
 import base64
 import io
 import os
-from typing import Any, Self
+from typing import TYPE_CHECKING, Any, Self
 
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_google_genai import ChatGoogleGenerativeAI
+from loguru import logger
 from pydantic import BaseModel, Field
 
+from src.shared import prewarm
 from src.shared.config import GeminiConfig
 from src.shared.logging import log_exec
-from src.shared.s3 import get_image
+from src.shared.s3 import get_images
+from src.shared.storage import get_backend
+from src.shared.tracing import trace_context
 from src.shared.type import SelectImgResponse
 
+if TYPE_CHECKING:
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+SELECT_IMAGE_MAX_DIMENSION = 768
+
+
+def _build_model() -> "ChatGoogleGenerativeAI":
+    # langchain_google_genai is ~1.5 s of import, so it loads with the model.
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    return ChatGoogleGenerativeAI(
+        model="gemini-2.5-flash",
+        temperature=0,
+        google_api_key=GeminiConfig().api_key,
+    )
+
+
+_model = prewarm.register("gemini_model", _build_model)
+_storage = prewarm.register("storage", get_backend)
+
 
 class SelectedImage(BaseModel):
     index: int = Field(ge=0, description="0-based index of selected image")
@@ -26,6 +48,7 @@ class SelectedImage(BaseModel):
 class SelectImgArgs(BaseModel):
     bucket_name: str
     image_keys: list[str]
+    exec_name: str | None = None
 
     @classmethod
     def from_event(cls, event: dict[str, Any]) -> Self:
@@ -33,21 +56,32 @@ class SelectImgArgs(BaseModel):
             {
                 "bucket_name": os.getenv("IMAGE_BUCKET"),
                 "image_keys": event.get("ImageKeys", []),
+                "exec_name": event.get("ExecName"),
             },
         )
 
 
 def decode_images(bucket_name: str, image_keys: list[str]) -> list[str]:
+    images = get_images(bucket_name, image_keys, SELECT_IMAGE_MAX_DIMENSION)
     results: list[str] = []
-    for key in image_keys:
+    errors: list[BaseException] = []
+    for key, image in zip(image_keys, images, strict=True):
+        if isinstance(image, BaseException):
+            logger.error(f"Failed to get image {key}: {image!s}")
+            errors.append(image)
+            continue
         image_bytes = io.BytesIO()
-        get_image(bucket_name, key).save(image_bytes, format="PNG")
+        image.save(image_bytes, format="PNG")
         decoded_image = base64.b64encode(image_bytes.getvalue()).decode()
         results.append(decoded_image)
+    if errors:
+        raise errors[0]
     return results
 
 
 def select_image(decoded_images: list[str]) -> SelectedImage:
+    from langchain_core.messages import HumanMessage
+
     def get_image_message(image: str) -> dict[str, Any]:
         return {
             "type": "image_url",
@@ -81,17 +115,13 @@ Please respond with only the number (0, 1, 2, 3, etc.) of the best image.
 """
     messages: list[dict[str, Any]] = [{"type": "text", "text": prompt_text}]
     messages.extend(get_image_message(image) for image in decoded_images)
-    prompt = ChatPromptTemplate.from_messages(
-        [
-            ("human", messages),
-        ],
-    )
-    model = ChatGoogleGenerativeAI(
-        model="gemini-2.5-flash",
-        temperature=0,
-    )
-    chain = prompt | model.with_structured_output(SelectedImage)
-    return chain.invoke({})  # type: ignore[return-value]
+    model = _model.get().with_structured_output(SelectedImage)
+    # A prompt template would put the data URLs in its serialized form, where
+    # the client cannot redact them; a plain message only shows up in inputs.
+    with trace_context():
+        return model.invoke(  # type: ignore[return-value]
+            [HumanMessage(content=messages)],  # type: ignore[arg-type]
+        )
 
 
 def handler(
@@ -103,8 +133,7 @@ def handler(
 
 @log_exec
 def main(args: SelectImgArgs) -> SelectImgResponse:
-    config = GeminiConfig()
-    os.environ["GOOGLE_API_KEY"] = config.api_key
+    _storage.get()
     decoded_images = decode_images(args.bucket_name, args.image_keys)
     response = select_image(decoded_images)
     selected_index = response.get_valid_index(len(args.image_keys))
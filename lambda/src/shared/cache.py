@@ -0,0 +1,50 @@
+import threading
+from collections import OrderedDict
+from collections.abc import Callable
+from pathlib import Path
+from typing import IO
+
+
+class DiskLRUCache:
+    def __init__(
+        self,
+        directory: Path,
+        max_bytes: int,
+        on_evict: Callable[[str], None] | None = None,
+    ) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.on_evict = on_evict
+        self._entries: OrderedDict[str, int] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def open(self, name: str) -> IO[bytes] | None:
+        with self._lock:
+            if name not in self._entries:
+                return None
+            self._entries.move_to_end(name)
+            # Opened under the lock so a concurrent eviction cannot unlink it first.
+            return (self.directory / name).open("rb")
+
+    def put(self, name: str, data: bytes | memoryview) -> bool:
+        if len(data) > self.max_bytes:
+            return False
+        tmp_path = self.directory / f".{name}.{threading.get_ident()}"
+        tmp_path.write_bytes(data)
+        with self._lock:
+            tmp_path.replace(self.directory / name)
+            self._size += len(data) - self._entries.pop(name, 0)
+            self._entries[name] = len(data)
+            while self._size > self.max_bytes:
+                evicted, size = self._entries.popitem(last=False)
+                (self.directory / evicted).unlink(missing_ok=True)
+                self._size -= size
+                if self.on_evict is not None:
+                    self.on_evict(evicted)
+        return True
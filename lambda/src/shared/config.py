@@ -1,85 +1,123 @@
 import os
-from typing import Any, cast
-
-import boto3
+import threading
+import time
+from collections.abc import Iterable
+from functools import cache
+from typing import TYPE_CHECKING, ClassVar
+
+if TYPE_CHECKING:
+    from botocore.client import BaseClient
+
+SSM_CACHE_TTL_SECONDS = float(os.getenv("SSM_CACHE_TTL_SECONDS", "900"))
+GET_PARAMETERS_MAX_NAMES = 10
+
+_parameters: dict[str, tuple[str, float]] = {}
+_parameters_lock = threading.Lock()
+
+
+@cache
+def get_ssm_client() -> "BaseClient":
+    import boto3
+
+    return boto3.client("ssm")
+
+
+def get_ssm_parameters(names: Iterable[str]) -> dict[str, str]:
+    names = list(dict.fromkeys(names))
+    now = time.monotonic()
+    with _parameters_lock:
+        values = {
+            name: value
+            for name, (value, expires_at) in _parameters.items()
+            if expires_at > now
+        }
+    missing = [name for name in names if name not in values]
+    for i in range(0, len(missing), GET_PARAMETERS_MAX_NAMES):
+        response = get_ssm_client().get_parameters(
+            Names=missing[i : i + GET_PARAMETERS_MAX_NAMES],
+            WithDecryption=True,
+        )
+        if response["InvalidParameters"]:
+            msg = f"SSM parameters not found: {response['InvalidParameters']}"
+            raise ValueError(msg)
+        expires_at = time.monotonic() + SSM_CACHE_TTL_SECONDS
+        with _parameters_lock:
+            for parameter in response["Parameters"]:
+                values[parameter["Name"]] = parameter["Value"]
+                _parameters[parameter["Name"]] = (parameter["Value"], expires_at)
+    return {name: values[name] for name in names}
 
 
 def get_ssm_parameter(name: str) -> str:
-    ssm = boto3.client("ssm")
-    parameter: dict[str, Any] = ssm.get_parameter(Name=name, WithDecryption=True)
-    return cast("str", parameter["Parameter"]["Value"])
+    return get_ssm_parameters([name])[name]
+
+
+class SSMConfig:
+    parameter_names: ClassVar[tuple[str, ...]] = ()
+
+    def _parameter(self, name: str) -> str:
+        # Resolve every parameter of the config in the same GetParameters call.
+        return get_ssm_parameters(self.parameter_names)[name]
+
+
+def load_parameters(*configs: type[SSMConfig]) -> None:
+    get_ssm_parameters(name for config in configs for name in config.parameter_names)
 
 
-class GeminiConfig:
-    def __init__(self) -> None:
-        self._api_key: str | None = None
+class GeminiConfig(SSMConfig):
+    parameter_names = ("/google/gemini/musabi/api-key",)
 
     @property
     def api_key(self) -> str:
-        if self._api_key is None:
-            self._api_key = get_ssm_parameter("/google/gemini/musabi/api-key")
-        return self._api_key
+        return self._parameter("/google/gemini/musabi/api-key")
 
 
-class OpenAIConfig:
-    def __init__(self) -> None:
-        self._api_key: str | None = None
+class OpenAIConfig(SSMConfig):
+    parameter_names = ("/openai/musabi/api-key",)
 
     @property
     def api_key(self) -> str:
-        if self._api_key is None:
-            self._api_key = get_ssm_parameter("/openai/musabi/api-key")
-        return self._api_key
+        return self._parameter("/openai/musabi/api-key")
 
     def setup_env(self) -> None:
         os.environ["OPENAI_API_KEY"] = self.api_key
 
 
-class MetaConfig:
-    def __init__(self) -> None:
-        self._access_token: str | None = None
-        self._account_id: str | None = None
-        self._version: str | None = None
-        self._graph_url: str | None = None
+class MetaConfig(SSMConfig):
+    parameter_names = (
+        "/meta/musabi/access-token",
+        "/meta/musabi/account-id",
+        "/meta/musabi/version",
+        "/meta/musabi/graph-url",
+    )
 
     @property
     def access_token(self) -> str:
-        if self._access_token is None:
-            self._access_token = get_ssm_parameter("/meta/musabi/access-token")
-        return self._access_token
+        return self._parameter("/meta/musabi/access-token")
 
     @property
     def account_id(self) -> str:
-        if self._account_id is None:
-            self._account_id = get_ssm_parameter("/meta/musabi/account-id")
-        return self._account_id
+        return self._parameter("/meta/musabi/account-id")
 
     @property
     def version(self) -> str:
-        if self._version is None:
-            self._version = get_ssm_parameter("/meta/musabi/version")
-        return self._version
+        return self._parameter("/meta/musabi/version")
 
     @property
     def graph_url(self) -> str:
-        if self._graph_url is None:
-            self._graph_url = get_ssm_parameter("/meta/musabi/graph-url")
-        return self._graph_url
+        return self._parameter("/meta/musabi/graph-url")
 
     @property
     def endpoint_base(self) -> str:
         return f"{self.graph_url}/{self.version}/"
 
 
-class LangSmithConfig:
-    def __init__(self) -> None:
-        self._api_key: str | None = None
+class LangSmithConfig(SSMConfig):
+    parameter_names = ("/langsmith/musabi/api-key",)
 
     @property
     def api_key(self) -> str:
-        if self._api_key is None:
-            self._api_key = get_ssm_parameter("/langsmith/musabi/api-key")
-        return self._api_key
+        return self._parameter("/langsmith/musabi/api-key")
 
     def setup_env(self) -> None:
         os.environ["LANGSMITH_TRACING"] = "true"
@@ -0,0 +1,132 @@
+import hashlib
+import heapq
+import json
+import math
+import os
+import re
+import unicodedata
+from collections import Counter
+from collections.abc import Iterable
+from typing import Self, TypedDict
+
+from src.shared.storage import get_backend
+
+DISH_INDEX_BUCKET = os.getenv("DISH_INDEX_BUCKET", "")
+DISH_INDEX_KEY = os.getenv("DISH_INDEX_KEY", "dish-index/index.json")
+DISH_SIMILARITY_THRESHOLD = float(os.getenv("DISH_SIMILARITY_THRESHOLD", "0.5"))
+# Dish names are short Japanese strings, so bigrams carry most of the signal.
+NAME_NGRAM = 2
+SKETCH_SIZE = 64
+INGREDIENTS_HEADER = "【材料】"
+_NON_WORD = re.compile(r"[\W_]+")
+# Matched after NFKC, so full-width colons and brackets are already ASCII.
+# "鶏もも肉 200g", "醤油:大さじ1", "卵(Mサイズ) 2個" -> the part before the amount.
+_INGREDIENT_NAME = re.compile(r"^[-・*\s]*([^\s:(]+)")
+
+
+class DishEntry(TypedDict):
+    Name: str
+    Sketch: list[int]
+
+
+class DishMatch(TypedDict):
+    Name: str
+    Similarity: float
+
+
+def _normalize(text: str) -> str:
+    return _NON_WORD.sub("", unicodedata.normalize("NFKC", text).lower())
+
+
+def _hash(shingle: str) -> int:
+    return int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=8).digest())
+
+
+def parse_ingredients(text: str) -> list[str]:
+    lines = text.removeprefix(INGREDIENTS_HEADER).splitlines()
+    return [line for line in lines if line.strip()]
+
+
+def shingles(name: str, ingredients: Iterable[str]) -> set[str]:
+    normalized = _normalize(name)
+    result = {
+        f"n:{normalized[i : i + NAME_NGRAM]}"
+        for i in range(max(1, len(normalized) - NAME_NGRAM + 1))
+    }
+    for ingredient in ingredients:
+        match = _INGREDIENT_NAME.match(unicodedata.normalize("NFKC", ingredient))
+        if match is not None and (ingredient_name := _normalize(match.group(1))):
+            result.add(f"i:{ingredient_name}")
+    return result
+
+
+def sketch(name: str, ingredients: Iterable[str]) -> list[int]:
+    # Bottom-k MinHash: one hash per shingle, keep the k smallest.
+    return sorted(heapq.nsmallest(SKETCH_SIZE, map(_hash, shingles(name, ingredients))))
+
+
+def similarity(a: list[int], b: list[int]) -> float:
+    union = heapq.nsmallest(SKETCH_SIZE, set(a) | set(b))
+    if not union:
+        return 0.0
+    both = set(a) & set(b)
+    return sum(1 for h in union if h in both) / len(union)
+
+
+class DishIndex:
+    def __init__(self, entries: Iterable[DishEntry] = ()) -> None:
+        self.entries: list[DishEntry] = []
+        self._postings: dict[int, list[int]] = {}
+        for entry in entries:
+            self._add_entry(entry)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _add_entry(self, entry: DishEntry) -> None:
+        entry_id = len(self.entries)
+        self.entries.append(entry)
+        for h in entry["Sketch"]:
+            self._postings.setdefault(h, []).append(entry_id)
+
+    def add(self, name: str, ingredients: Iterable[str]) -> None:
+        self._add_entry({"Name": name, "Sketch": sketch(name, ingredients)})
+
+    def query(
+        self,
+        name: str,
+        ingredients: Iterable[str],
+        threshold: float = DISH_SIMILARITY_THRESHOLD,
+    ) -> DishMatch | None:
+        query_sketch = sketch(name, ingredients)
+        shared: Counter[int] = Counter()
+        for h in query_sketch:
+            shared.update(self._postings.get(h, ()))
+        # Sharing fewer than threshold * |query| hashes rules out a match.
+        min_shared = max(1, math.ceil(threshold * len(query_sketch)))
+        best: DishMatch | None = None
+        for entry_id, n in shared.items():
+            if n < min_shared:
+                continue
+            entry = self.entries[entry_id]
+            score = similarity(query_sketch, entry["Sketch"])
+            if score >= threshold and (best is None or score > best["Similarity"]):
+                best = {"Name": entry["Name"], "Similarity": score}
+        return best
+
+    @classmethod
+    def load(cls, bucket_name: str, key: str = DISH_INDEX_KEY) -> Self:
+        response = get_backend().find(bucket_name, key)
+        if response is None:
+            return cls()
+        entries: list[DishEntry] = json.loads(b"".join(response["Body"]))
+        return cls(entries)
+
+    def save(self, bucket_name: str, key: str = DISH_INDEX_KEY) -> None:
+        get_backend().put(
+            bucket_name,
+            key,
+            json.dumps(self.entries, ensure_ascii=False).encode(),
+            "application/json",
+            {},
+        )
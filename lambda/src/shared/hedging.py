@@ -0,0 +1,185 @@
+import json
+import math
+import os
+import random
+import threading
+import time
+from collections import deque
+from collections.abc import Callable
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextvars import copy_context
+from functools import cache
+from typing import Self
+
+from loguru import logger
+
+from src.shared.logging import count
+from src.shared.storage import get_backend
+
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "0.9"))
+HEDGE_DEFAULT_DELAY_SECONDS = float(os.getenv("HEDGE_DEFAULT_DELAY_SECONDS", "30"))
+HEDGE_MIN_SAMPLES = 10
+HEDGE_MAX_WORKERS = 8
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "3"))
+RETRY_BACKOFF_SECONDS = 1.0
+RETRY_BACKOFF_MAX_SECONDS = 8.0
+# Kept back from the Lambda timeout so the result can still be returned and logged.
+DEADLINE_MARGIN_SECONDS = float(os.getenv("DEADLINE_MARGIN_SECONDS", "5"))
+
+
+class DeadlineExceededError(TimeoutError):
+    pass
+
+
+class Deadline:
+    def __init__(self, at: float = math.inf) -> None:
+        self.at = at
+
+    @classmethod
+    def after(cls, seconds: float | None) -> Self:
+        return cls() if seconds is None else cls(time.monotonic() + seconds)
+
+    @classmethod
+    def from_remaining_ms(cls, remaining_ms: int | None) -> Self:
+        if remaining_ms is None:
+            return cls()
+        return cls.after(remaining_ms / 1000 - DEADLINE_MARGIN_SECONDS)
+
+    def remaining(self) -> float:
+        return self.at - time.monotonic()
+
+
+def remaining_ms(context: object) -> int | None:
+    get_remaining = getattr(context, "get_remaining_time_in_millis", None)
+    return None if get_remaining is None else int(get_remaining())
+
+
+class LatencyTracker:
+    def __init__(self, default: float, max_samples: int = 200) -> None:
+        self.default = default
+        self._samples: deque[float] = deque(maxlen=max_samples)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float) -> float:
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return self.default
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    # A container sees too few calls to reach HEDGE_MIN_SAMPLES on its own, so
+    # samples are kept in storage and shared across containers and invocations.
+    def load(self, bucket_name: str, key: str) -> None:
+        response = get_backend().find(bucket_name, key)
+        if response is None:
+            return
+        samples: list[float] = json.loads(b"".join(response["Body"]))
+        with self._lock:
+            # The stored samples already include this container's last save.
+            self._samples.clear()
+            self._samples.extend(samples)
+
+    def save(self, bucket_name: str, key: str) -> None:
+        with self._lock:
+            samples = [round(sample, 3) for sample in self._samples]
+        get_backend().put(
+            bucket_name,
+            key,
+            json.dumps(samples).encode(),
+            "application/json",
+            {},
+        )
+
+
+@cache
+def _get_executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(
+        max_workers=HEDGE_MAX_WORKERS,
+        thread_name_prefix="hedge",
+    )
+
+
+def _submit[T](func: Callable[[], T], tracker: LatencyTracker) -> Future[T]:
+    start = time.monotonic()
+    future = _get_executor().submit(copy_context().run, func)
+
+    def record(done: Future[T]) -> None:
+        # Losing requests are recorded too, so hedging does not bias the tracker.
+        if not done.cancelled() and done.exception() is None:
+            tracker.record(time.monotonic() - start)
+
+    future.add_done_callback(record)
+    return future
+
+
+def _hedged_attempt[T](
+    func: Callable[[], T],
+    deadline: Deadline,
+    tracker: LatencyTracker,
+    name: str,
+) -> T:
+    pending = {_submit(func, tracker)}
+    hedge_at = time.monotonic() + tracker.percentile(HEDGE_PERCENTILE)
+    hedged = False
+    error: BaseException | None = None
+    while pending:
+        now = time.monotonic()
+        if now >= deadline.at:
+            msg = f"{name} did not finish before the deadline."
+            raise DeadlineExceededError(msg)
+        until = deadline.at if hedged else min(deadline.at, hedge_at)
+        done, pending = wait(
+            pending,
+            timeout=None if math.isinf(until) else until - now,
+            return_when=FIRST_COMPLETED,
+        )
+        for future in done:
+            error = future.exception()
+            if error is None:
+                return future.result()
+        if not hedged and pending and time.monotonic() >= hedge_at:
+            # The slow request keeps running; whichever finishes first wins.
+            hedged = True
+            count(f"{name}_hedged")
+            logger.info(f"{name} is slower than p{HEDGE_PERCENTILE * 100:.0f}, hedge")
+            pending.add(_submit(func, tracker))
+    if error is None:
+        msg = f"{name} finished without a result."
+        raise RuntimeError(msg)
+    raise error
+
+
+def hedged_call[T](
+    func: Callable[[], T],
+    deadline: Deadline,
+    tracker: LatencyTracker,
+    name: str = "call",
+) -> T:
+    for attempt in range(1, RETRY_MAX_ATTEMPTS + 1):
+        try:
+            return _hedged_attempt(func, deadline, tracker, name)
+        except DeadlineExceededError:
+            raise
+        except Exception as e:
+            backoff = random.uniform(  # noqa: S311
+                0,
+                min(
+                    RETRY_BACKOFF_MAX_SECONDS,
+                    RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1),
+                ),
+            )
+            # Only retry while a typical call still fits before the deadline.
+            if (
+                attempt == RETRY_MAX_ATTEMPTS
+                or deadline.remaining() - backoff < tracker.percentile(0.5)
+            ):
+                raise
+            count(f"{name}_retry")
+            logger.warning(f"{name} failed ({e!s}), retry in {backoff:.1f} s")
+            time.sleep(backoff)
+    msg = f"{name} exhausted {RETRY_MAX_ATTEMPTS} attempts."
+    raise RuntimeError(msg)
@@ -0,0 +1,92 @@
+import struct
+
+from src.shared.type import ImageInfo
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_MODES = {0: "L", 2: "RGB", 3: "P", 4: "LA", 6: "RGBA"}
+JPEG_MODES = {1: "L", 3: "RGB", 4: "CMYK"}
+# SOF0-SOF15 excluding DHT (C4), JPG (C8) and DAC (CC).
+JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+JPEG_STANDALONE_MARKERS = frozenset([0x01, *range(0xD0, 0xD9)])
+
+
+def parse_image_header(data: bytes) -> ImageInfo | None:
+    if data.startswith(PNG_SIGNATURE):
+        return _parse_png(data)
+    if data.startswith(b"\xff\xd8"):
+        return _parse_jpeg(data)
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return _parse_webp(data)
+    return None
+
+
+def _parse_png(data: bytes) -> ImageInfo | None:
+    if len(data) < 26 or data[12:16] != b"IHDR":  # noqa: PLR2004
+        return None
+    width, height, _, color_type = struct.unpack(">IIBB", data[16:26])
+    return {
+        "Width": width,
+        "Height": height,
+        "Mode": PNG_MODES.get(color_type, "RGB"),
+        "Format": "PNG",
+    }
+
+
+def _parse_jpeg(data: bytes) -> ImageInfo | None:
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:  # noqa: PLR2004
+            return None
+        marker = data[pos + 1]
+        if marker == 0xFF:  # noqa: PLR2004
+            pos += 1
+            continue
+        if marker in JPEG_STANDALONE_MARKERS:
+            pos += 2
+            continue
+        (length,) = struct.unpack(">H", data[pos + 2 : pos + 4])
+        if marker in JPEG_SOF_MARKERS:
+            if pos + 10 > len(data):
+                return None
+            height, width, components = struct.unpack(
+                ">HHB",
+                data[pos + 5 : pos + 10],
+            )
+            return {
+                "Width": width,
+                "Height": height,
+                "Mode": JPEG_MODES.get(components, "RGB"),
+                "Format": "JPEG",
+            }
+        pos += 2 + length
+    return None
+
+
+def _parse_webp(data: bytes) -> ImageInfo | None:
+    if len(data) < 30:  # noqa: PLR2004
+        return None
+    chunk = data[12:16]
+    if chunk == b"VP8 ":
+        width, height = struct.unpack("<HH", data[26:30])
+        return {
+            "Width": width & 0x3FFF,
+            "Height": height & 0x3FFF,
+            "Mode": "RGB",
+            "Format": "WEBP",
+        }
+    if chunk == b"VP8L":
+        (bits,) = struct.unpack("<I", data[21:25])
+        return {
+            "Width": (bits & 0x3FFF) + 1,
+            "Height": ((bits >> 14) & 0x3FFF) + 1,
+            "Mode": "RGBA" if (bits >> 28) & 1 else "RGB",
+            "Format": "WEBP",
+        }
+    if chunk == b"VP8X":
+        return {
+            "Width": int.from_bytes(data[24:27], "little") + 1,
+            "Height": int.from_bytes(data[27:30], "little") + 1,
+            "Mode": "RGBA" if data[20] & 0x10 else "RGB",
+            "Format": "WEBP",
+        }
+    return None
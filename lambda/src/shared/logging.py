@@ -1,30 +1,287 @@
+import itertools
 import json
-from collections.abc import Callable
+import os
+import random
+import re
+import resource
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
 from functools import wraps
 
 from loguru import logger
+from pydantic import BaseModel
+
+from src.shared import profiling
+
+LOG_EXEC_MAX_BYTES = int(os.getenv("LOG_EXEC_MAX_BYTES", "4096"))
+LOG_EXEC_SAMPLE_RATE = float(os.getenv("LOG_EXEC_SAMPLE_RATE", "1.0"))
+BASE64_MIN_LENGTH = 256
+# Only a prefix is matched so the check costs the same for any payload size.
+_BASE64_PREFIX = re.compile(r"(data:[\w/+.-]+;base64,)?[A-Za-z0-9+/=\r\n]+")
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+METRICS_NAMESPACE = os.getenv("METRICS_NAMESPACE", "Musabi")
+TRACE_ENABLED = os.getenv("TRACE_ENABLED", "true").lower() == "true"
+TRACE_RECORD_TYPE = "musabi.trace"
+TRACE_MAX_SPANS = 200
+
+_counters: Counter[str] = Counter()
+_counters_lock = threading.Lock()
+# The first invocation in a container is the cold one.
+_invocations = itertools.count()
+
+
+class Span:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.start = time.perf_counter()
+        self.duration_ms = 0.0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.children: list[Span] = []
+
+    def walk(self) -> Iterator["Span"]:
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+
+_current_span: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+
+@contextmanager
+def span(name: str) -> Iterator[Span]:
+    parent = _current_span.get()
+    current = Span(name)
+    if parent is not None:
+        parent.children.append(current)
+    token = _current_span.set(current)
+    try:
+        yield current
+    finally:
+        current.duration_ms = (time.perf_counter() - current.start) * 1000
+        _current_span.reset(token)
+
+
+def add_bytes(bytes_in: int = 0, bytes_out: int = 0) -> None:
+    current = _current_span.get()
+    if current is not None:
+        current.bytes_in += bytes_in
+        current.bytes_out += bytes_out
+
+
+def count(name: str, value: int = 1) -> None:
+    with _counters_lock:
+        _counters[name] += value
+
+
+def pop_counters() -> dict[str, int]:
+    with _counters_lock:
+        counters = dict(_counters)
+        _counters.clear()
+    return counters
+
+
+class _Budget:
+    def __init__(self, remaining: int) -> None:
+        self.remaining = remaining
+
+    def take_text(self, text: str) -> str:
+        chunk = text[: self.remaining].encode()[: self.remaining]
+        self.remaining -= len(chunk)
+        truncated = chunk.decode(errors="ignore")
+        if len(truncated) < len(text):
+            return f"{truncated}...(+{len(text) - len(truncated)} chars)"
+        return truncated
+
+
+def _bounded_items(
+    items: Iterable[tuple[str, object]],
+    total: int,
+    budget: _Budget,
+) -> list[tuple[str, object]]:
+    result: list[tuple[str, object]] = []
+    for i, (key, item) in enumerate(items):
+        if budget.remaining <= 0:
+            result.append(("...", f"+{total - i} items"))
+            break
+        result.append((budget.take_text(key), _bounded(item, budget)))
+    return result
+
+
+def _bounded(value: object, budget: _Budget) -> object:
+    if value is None or isinstance(value, bool | int | float):
+        budget.remaining -= 8
+        return value
+    if isinstance(value, bytes | bytearray | memoryview):
+        budget.remaining -= 16
+        return f"<{len(value)} bytes>"
+    if isinstance(value, BaseModel):
+        value = dict(value)
+    if isinstance(value, dict):
+        items = ((str(key), item) for key, item in value.items())
+        return dict(_bounded_items(items, len(value), budget))
+    if isinstance(value, list | tuple | set | frozenset):
+        entries = (("", item) for item in value)
+        return [item for _, item in _bounded_items(entries, len(value), budget)]
+    text = value if isinstance(value, str) else str(value)
+    if len(text) >= BASE64_MIN_LENGTH and _BASE64_PREFIX.fullmatch(
+        text[:BASE64_MIN_LENGTH],
+    ):
+        budget.remaining -= 32
+        return f"<base64 {len(text)} chars>"
+    return budget.take_text(text)
+
+
+def bounded_dumps(value: object, max_bytes: int = LOG_EXEC_MAX_BYTES) -> str:
+    return json.dumps(_bounded(value, _Budget(max_bytes)), ensure_ascii=False)
+
+
+def _log_payload(label: str, value: object) -> None:
+    # lazy=True skips serialization when no sink accepts INFO records.
+    logger.opt(lazy=True, depth=1).info(
+        "{}: {}",
+        lambda: label,
+        lambda: bounded_dumps(value),
+    )
+
+
+def _stage_name(func: Callable[..., object]) -> str:
+    # src.<stage>.handler -> <stage>
+    parts = func.__module__.split(".")
+    return parts[-2] if len(parts) > 1 else func.__name__
+
+
+def emit_metrics(function_name: str, root: Span, counters: dict[str, int]) -> None:
+    durations: defaultdict[str, float] = defaultdict(float)
+    for child in root.walk():
+        durations[child.name] += child.duration_ms
+    metrics: dict[str, tuple[float, str]] = {
+        f"{name}.Duration": (round(duration, 3), "Milliseconds")
+        for name, duration in durations.items()
+    }
+    metrics["BytesIn"] = (sum(s.bytes_in for s in root.walk()), "Bytes")
+    metrics["BytesOut"] = (sum(s.bytes_out for s in root.walk()), "Bytes")
+    # ru_maxrss is reported in kilobytes on Linux.
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    metrics["PeakRSS"] = (peak_rss, "Kilobytes")
+    metrics.update({name: (value, "Count") for name, value in counters.items()})
+    record = {
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [
+                {
+                    "Namespace": METRICS_NAMESPACE,
+                    "Dimensions": [["Function"]],
+                    "Metrics": [
+                        {"Name": name, "Unit": unit}
+                        for name, (_, unit) in metrics.items()
+                    ],
+                },
+            ],
+        },
+        "Function": function_name,
+        **{name: value for name, (value, _) in metrics.items()},
+    }
+    # EMF must be a bare JSON line, so bypass the loguru formatter.
+    sys.stdout.write(json.dumps(record) + "\n")
+    sys.stdout.flush()
+
+
+def _find_arg(args: Iterable[object], name: str) -> object | None:
+    for arg in args:
+        value: object = getattr(arg, name, None)
+        if value is not None:
+            return value
+    return None
+
+
+def _trace_spans(
+    parent: Span,
+    origin: float,
+    depth: int = 0,
+) -> Iterator[list[object]]:
+    # [name, depth, offset_ms, duration_ms] keeps a record well under a log line.
+    for child in parent.children:
+        offset_ms = (child.start - origin) * 1000
+        yield [child.name, depth, round(offset_ms, 1), round(child.duration_ms, 1)]
+        yield from _trace_spans(child, origin, depth + 1)
+
+
+def emit_trace(  # noqa: PLR0913
+    stage: str,
+    root: Span,
+    started_at: float,
+    *,
+    exec_name: object,
+    branch: object,
+    cold: bool,
+) -> None:
+    record = {
+        "Type": TRACE_RECORD_TYPE,
+        "ExecName": exec_name,
+        "Stage": stage,
+        "Branch": branch,
+        "Start": round(started_at, 3),
+        "End": round(started_at + root.duration_ms / 1000, 3),
+        "Cold": cold,
+        "Spans": list(
+            itertools.islice(_trace_spans(root, root.start), TRACE_MAX_SPANS),
+        ),
+    }
+    sys.stdout.write(json.dumps(record, ensure_ascii=False) + "\n")
+    sys.stdout.flush()
 
 
 def log_exec[T, **P](func: Callable[P, T]) -> Callable[P, T]:
     @wraps(func)
     def inner(*args: P.args, **kwargs: P.kwargs) -> T:
+        sampled = random.random() < LOG_EXEC_SAMPLE_RATE  # noqa: S311
         logger.info(f"{func.__name__} function called")
-        logger.info(
-            f"Args: {json.dumps(args, ensure_ascii=False, default=str)}",
-        )
-        logger.info(
-            f"Kwargs: {json.dumps(kwargs, ensure_ascii=False, default=str)}",
-        )
+        if sampled:
+            _log_payload("Args", args)
+            _log_payload("Kwargs", kwargs)
+        cold = next(_invocations) == 0
+        stage = _stage_name(func)
+        exec_name = _find_arg(args, "exec_name")
+        branch = _find_arg(args, "parallel_index")
+        started_at = time.time()
+        root = Span(func.__name__)
+        token = _current_span.set(root)
         try:
-            result = func(*args, **kwargs)
-            logger.info(
-                f"{func.__name__} function result: "
-                f"{json.dumps(result, ensure_ascii=False, default=str)}",
-            )
+            with profiling.profile(
+                stage if branch is None else f"{stage}-{branch}",
+                None if exec_name is None else str(exec_name),
+            ):
+                result = func(*args, **kwargs)
+            if sampled:
+                _log_payload(f"{func.__name__} function result", result)
         except Exception as e:
             logger.error(f"{func.__name__} function failed: {e!s}")
             raise
         else:
             return result
+        finally:
+            root.duration_ms = (time.perf_counter() - root.start) * 1000
+            _current_span.reset(token)
+            counters = pop_counters()
+            if counters:
+                logger.info(f"{func.__name__} function counters: {counters}")
+            if METRICS_ENABLED:
+                emit_metrics(stage, root, counters)
+            if TRACE_ENABLED:
+                emit_trace(
+                    stage,
+                    root,
+                    started_at,
+                    exec_name=exec_name,
+                    branch=branch,
+                    cold=cold,
+                )
 
     return inner
@@ -0,0 +1,88 @@
+import os
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import cache
+
+from loguru import logger
+
+# Only prewarm inside Lambda by default, so local dry runs stay lazy.
+PREWARM_ENABLED = (
+    os.getenv("PREWARM", str("AWS_LAMBDA_FUNCTION_NAME" in os.environ)).lower()
+    == "true"
+)
+
+
+@cache
+def _get_executor() -> ThreadPoolExecutor:
+    # A single worker keeps registration order, so secrets resolve before clients.
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix="prewarm")
+
+
+class Prewarmed[T]:
+    def __init__(self, name: str, factory: Callable[[], T]) -> None:
+        self.name = name
+        self.factory = factory
+        self.build_ms: float | None = None
+        self._future: Future[T] | None = None
+        self._reported = False
+        self._lock = threading.Lock()
+
+    def _build(self) -> T:
+        start = time.perf_counter()
+        value = self.factory()
+        self.build_ms = (time.perf_counter() - start) * 1000
+        return value
+
+    def start(self) -> None:
+        with self._lock:
+            if self._future is None:
+                self._future = _get_executor().submit(self._build)
+
+    def _run(self, future: Future[T]) -> None:
+        try:
+            future.set_result(self._build())
+        except Exception as e:  # noqa: BLE001
+            future.set_exception(e)
+
+    def get(self) -> T:
+        start = time.perf_counter()
+        retried = False
+        while True:
+            # Whoever installs the future builds it; concurrent callers wait on it.
+            with self._lock:
+                future = self._future
+                owner = future is None
+                if future is None:
+                    future = self._future = Future()
+            if owner:
+                self._run(future)
+            try:
+                value = future.result()
+                break
+            except Exception as e:
+                # Never cache a failed init, so the next invocation builds again.
+                with self._lock:
+                    if self._future is future:
+                        self._future = None
+                if owner or retried:
+                    raise
+                # A transient error during init should not fail the invocation.
+                retried = True
+                logger.warning(f"Prewarm {self.name} failed ({e!s}), build inline")
+        if not self._reported:
+            self._reported = True
+            wait_ms = (time.perf_counter() - start) * 1000
+            logger.info(
+                f"Prewarm {self.name}: built in {self.build_ms:.1f} ms, "
+                f"invoke waited {wait_ms:.1f} ms",
+            )
+        return value
+
+
+def register[T](name: str, factory: Callable[[], T]) -> Prewarmed[T]:
+    prewarmed = Prewarmed(name, factory)
+    if PREWARM_ENABLED:
+        prewarmed.start()
+    return prewarmed
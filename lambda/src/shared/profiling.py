@@ -0,0 +1,172 @@
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from types import FrameType
+
+from loguru import logger
+
+# off | cprofile | sample
+PROFILE_MODE = os.getenv("PROFILE_MODE", "off").lower()
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "1.0"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "10"))
+# tracemalloc slows allocation-heavy code several times over, so it is opt-in.
+PROFILE_TRACEMALLOC = os.getenv("PROFILE_TRACEMALLOC", "false").lower() == "true"
+PROFILE_TOP_ENTRIES = int(os.getenv("PROFILE_TOP_ENTRIES", "25"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "/tmp/profiles")  # noqa: S108
+# Uploads are skipped unless a bucket is configured.
+PROFILE_BUCKET = os.getenv("PROFILE_BUCKET", "")
+# One frame is enough for per-line sites and keeps tracing affordable.
+TRACEMALLOC_FRAMES = 1
+
+
+def _frame_name(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{code.co_qualname} ({Path(code.co_filename).name}:{frame.f_lineno})"
+
+
+def _is_idle(frame: FrameType) -> bool:
+    # Pool workers parked on a condition variable only add noise.
+    return frame.f_code.co_name == "wait" and frame.f_code.co_filename.endswith(
+        "threading.py",
+    )
+
+
+class SamplingProfiler:
+    def __init__(self, interval: float, target: int) -> None:
+        self.interval = interval
+        self.target = target
+        self.stacks: Counter[str] = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run,
+            name="profiler",
+            daemon=True,
+        )
+
+    def _sample(self) -> None:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, leaf in sys._current_frames().items():  # noqa: SLF001
+            if ident == self._thread.ident or (ident != self.target and _is_idle(leaf)):
+                continue
+            stack: list[str] = []
+            frame: FrameType | None = leaf
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            stack.append(names.get(ident, str(ident)))
+            self.stacks[";".join(reversed(stack))] += 1
+        self.samples += 1
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {n}\n" for stack, n in self.stacks.most_common())
+
+
+def _top_allocations() -> str:
+    _, peak = tracemalloc.get_traced_memory()
+    # Only memory still held at the end shows up here, which is what grows a
+    # warm container; the peak covers what the invocation freed on the way.
+    snapshot = tracemalloc.take_snapshot().filter_traces(
+        [
+            tracemalloc.Filter(
+                inclusive=False,
+                filename_pattern=__file__,
+                all_frames=True,
+            ),
+            tracemalloc.Filter(inclusive=False, filename_pattern=tracemalloc.__file__),
+        ],
+    )
+    stats = snapshot.statistics("lineno")[:PROFILE_TOP_ENTRIES]
+    lines = [f"Peak traced memory {peak / 1024:.1f} KiB, top retained sites:"]
+    lines.extend(
+        f"{stat.size / 1024:10.1f} KiB {stat.count:8} blocks  {stat.traceback[0]}"
+        for stat in stats
+    )
+    return "\n".join(lines) + "\n"
+
+
+def _export(artifacts: dict[str, bytes], name: str, exec_name: str | None) -> None:
+    directory = Path(PROFILE_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    for suffix, data in artifacts.items():
+        path = directory / f"{name}.{suffix}"
+        path.write_bytes(data)
+        logger.info(f"Profile written to {path} ({len(data)} bytes)")
+        if PROFILE_BUCKET:
+            # Imported here so stages without storage do not pay for boto3.
+            from src.shared.storage import get_backend
+
+            key = f"{exec_name or 'no-exec'}/profiles/{path.name}"
+            get_backend().put(PROFILE_BUCKET, key, data, "text/plain", {})
+            logger.info(f"Profile uploaded to s3://{PROFILE_BUCKET}/{key}")
+
+
+def _should_profile() -> bool:
+    if PROFILE_MODE not in ("cprofile", "sample"):
+        return False
+    return random.random() < PROFILE_SAMPLE_RATE  # noqa: S311
+
+
+@contextmanager
+def profile(label: str, exec_name: str | None) -> Iterator[None]:
+    if not _should_profile():
+        yield
+        return
+    trace_memory = PROFILE_TRACEMALLOC and not tracemalloc.is_tracing()
+    if trace_memory:
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+    profiler: cProfile.Profile | SamplingProfiler
+    if PROFILE_MODE == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+    else:
+        profiler = SamplingProfiler(PROFILE_INTERVAL_MS / 1000, threading.get_ident())
+        profiler.start()
+    try:
+        yield
+    finally:
+        artifacts: dict[str, bytes] = {}
+        if isinstance(profiler, cProfile.Profile):
+            profiler.disable()
+            profiler.create_stats()
+            # Same bytes as Profile.dump_stats, without a temporary file.
+            artifacts["pstats"] = marshal.dumps(profiler.stats)
+            summary = io.StringIO()
+            pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(
+                PROFILE_TOP_ENTRIES,
+            )
+            artifacts["pstats.txt"] = summary.getvalue().encode()
+        else:
+            profiler.stop()
+            artifacts["collapsed"] = profiler.collapsed().encode()
+        if trace_memory:
+            artifacts["alloc.txt"] = _top_allocations().encode()
+            tracemalloc.stop()
+        name = f"{label}-{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"
+        try:
+            _export(artifacts, name, exec_name)
+        except Exception as e:  # noqa: BLE001
+            # A failed export must not fail the invocation being profiled.
+            logger.warning(f"Failed to export profile {name}: {e!s}")
@@ -1,26 +1,398 @@
+import hashlib
 import io
+import os
+import threading
+from collections.abc import Callable, Iterable
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextvars import copy_context
+from functools import cache
+from pathlib import Path
+from typing import IO, Any, Literal, cast
 
-import boto3
+from botocore.exceptions import ClientError
+from loguru import logger
 from PIL import Image
+from pydantic import BaseModel, ConfigDict, Field
 
+from src.shared.cache import DiskLRUCache
+from src.shared.image_header import parse_image_header
+from src.shared.logging import add_bytes, count, span
+from src.shared.storage import S3_MAX_POOL_CONNECTIONS, StorageObject, get_backend
+from src.shared.type import ImageInfo, ObjectMeta
 
-def get_image(bucket_name: str, s3_object_key: str) -> Image.Image:
-    s3_client = boto3.client("s3")
-    response = s3_client.get_object(Bucket=bucket_name, Key=s3_object_key)
-    image_bytes = response["Body"].read()
-    return Image.open(io.BytesIO(image_bytes))
+SHA256_METADATA_KEY = "sha256"
+# A JPEG with a large EXIF block can push SOF past the first range.
+PROBE_RANGES = (64 * 1024, 512 * 1024)
+S3_CACHE_DIR = os.getenv("S3_CACHE_DIR", "/tmp/s3-cache")  # noqa: S108
+S3_CACHE_MAX_BYTES = int(os.getenv("S3_CACHE_MAX_BYTES", "0"))
+# Step Functions retries rewrite GenImg's keys with new bytes, so a hit is only
+# served after a HEAD confirms the ETag. Disable only for keys never rewritten.
+S3_CACHE_REVALIDATE = os.getenv("S3_CACHE_REVALIDATE", "true").lower() == "true"
+MAX_IMAGE_DIMENSION = 8192
 
+_local = threading.local()
+_etags: dict[tuple[str, str], str] = {}
+# Cache entry name -> key, so evicted entries drop out of _etags as well.
+_cached_keys: dict[str, tuple[str, str]] = {}
+_etags_lock = threading.Lock()
 
-def put_image(image: Image.Image, bucket_name: str, s3_object_key: str) -> str:
-    image_buffer = io.BytesIO()
-    image.save(image_buffer, format="PNG")
-    image_buffer.seek(0)
 
-    s3_client = boto3.client("s3")
-    s3_client.put_object(
-        Bucket=bucket_name,
-        Key=s3_object_key,
-        Body=image_buffer,
-        ContentType="image/png",
+class ImageEncoding(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
+    format: Literal["PNG", "JPEG", "WEBP"] = "PNG"
+    compress_level: int = Field(default=6, ge=0, le=9)
+    quality: int = Field(default=90, ge=1, le=100)
+    optimize: bool = False
+    progressive: bool = False
+
+    @property
+    def content_type(self) -> str:
+        return f"image/{self.format.lower()}"
+
+    def save_options(self) -> dict[str, Any]:
+        if self.format == "PNG":
+            return {"compress_level": self.compress_level, "optimize": self.optimize}
+        if self.format == "JPEG":
+            return {
+                "quality": self.quality,
+                "optimize": self.optimize,
+                "progressive": self.progressive,
+            }
+        return {"quality": self.quality}
+
+
+# Intermediate objects favour encode speed, published ones favour size.
+FAST_ENCODING = ImageEncoding(compress_level=1)
+PUBLISH_ENCODING = ImageEncoding()
+
+type PutItem = tuple[Image.Image, str, str]
+type PutBytesItem = tuple[bytes, str, str]
+
+
+class _BufferReader(io.RawIOBase):
+    def __init__(self, view: memoryview) -> None:
+        self._view = view
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: Any) -> int:  # noqa: ANN401
+        size = min(len(buffer), len(self._view) - self._pos)
+        buffer[:size] = self._view[self._pos : self._pos + size]
+        self._pos += size
+        return size
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        self._pos = max(0, min(offset, len(self._view)))
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def getbuffer(self) -> memoryview:
+        return self._view
+
+    def close(self) -> None:
+        self._view.release()
+        super().close()
+
+
+@cache
+def _get_cache() -> DiskLRUCache | None:
+    if S3_CACHE_MAX_BYTES <= 0:
+        return None
+    return DiskLRUCache(Path(S3_CACHE_DIR), S3_CACHE_MAX_BYTES, _forget_entry)
+
+
+def _remember(bucket_name: str, s3_object_key: str, etag: str, name: str) -> None:
+    with _etags_lock:
+        _etags[(bucket_name, s3_object_key)] = etag
+        _cached_keys[name] = (bucket_name, s3_object_key)
+
+
+def _forget(bucket_name: str, s3_object_key: str) -> None:
+    with _etags_lock:
+        etag = _etags.pop((bucket_name, s3_object_key), None)
+        if etag is not None:
+            _cached_keys.pop(_cache_name(bucket_name, s3_object_key, etag), None)
+
+
+def _forget_entry(name: str) -> None:
+    with _etags_lock:
+        key = _cached_keys.pop(name, None)
+        # A newer ETag for the same key has its own entry; leave it alone.
+        if key is not None and _cache_name(*key, _etags.get(key, "")) == name:
+            del _etags[key]
+
+
+@cache
+def _get_executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(
+        max_workers=S3_MAX_POOL_CONNECTIONS,
+        thread_name_prefix="s3",
+    )
+
+
+def _map_settled[T, R](
+    func: Callable[[T], R],
+    items: Iterable[T],
+) -> list[R | BaseException]:
+    # Each task runs in a copy of the caller's context so its spans nest correctly.
+    futures: list[Future[R]] = [
+        _get_executor().submit(copy_context().run, func, item) for item in items
+    ]
+    results: list[R | BaseException] = []
+    for future in futures:
+        error = future.exception()
+        results.append(future.result() if error is None else error)
+    return results
+
+
+def _get_buffer(size: int) -> bytearray:
+    buffer: bytearray | None = getattr(_local, "buffer", None)
+    if buffer is None or len(buffer) < size:
+        buffer = bytearray(size)
+        _local.buffer = buffer
+    return buffer
+
+
+def _read_body(response: StorageObject) -> _BufferReader:
+    view = memoryview(_get_buffer(response["ContentLength"]))
+    size = 0
+    for chunk in response["Body"]:
+        view[size : size + len(chunk)] = chunk
+        size += len(chunk)
+    return _BufferReader(view[:size])
+
+
+def _cache_name(bucket_name: str, s3_object_key: str, etag: str) -> str:
+    return hashlib.sha256(f"{bucket_name}/{s3_object_key}/{etag}".encode()).hexdigest()
+
+
+def _open_cached(
+    disk_cache: DiskLRUCache,
+    bucket_name: str,
+    s3_object_key: str,
+) -> IO[bytes] | None:
+    with _etags_lock:
+        etag = _etags.get((bucket_name, s3_object_key))
+    if etag is None:
+        return None
+    cached = disk_cache.open(_cache_name(bucket_name, s3_object_key, etag))
+    if cached is None or not S3_CACHE_REVALIDATE:
+        return cached
+    head = get_backend().head(bucket_name, s3_object_key)
+    if head is not None and head["ETag"] == etag:
+        return cached
+    cached.close()
+    return None
+
+
+def _open_object(bucket_name: str, s3_object_key: str) -> IO[bytes]:
+    disk_cache = _get_cache()
+    if disk_cache is not None:
+        cached = _open_cached(disk_cache, bucket_name, s3_object_key)
+        if cached is not None:
+            count("s3_cache_hit")
+            return cached
+        count("s3_cache_miss")
+    response = get_backend().get(bucket_name, s3_object_key)
+    reader = _read_body(response)
+    if disk_cache is not None:
+        etag = response["ETag"]
+        name = _cache_name(bucket_name, s3_object_key, etag)
+        if disk_cache.put(name, reader.getbuffer()):
+            _remember(bucket_name, s3_object_key, etag, name)
+    return cast("IO[bytes]", reader)
+
+
+def decode_image(fp: IO[bytes], max_dimension: int | None = None) -> Image.Image:
+    image = Image.open(fp)
+    if max_dimension is not None:
+        # JPEG decodes at a reduced DCT scale; other formats are reduced after decode.
+        image.draft(None, (max_dimension, max_dimension))
+        image.thumbnail((max_dimension, max_dimension))
+    image.load()
+    return image
+
+
+def get_image(
+    bucket_name: str,
+    s3_object_key: str,
+    max_dimension: int | None = None,
+) -> Image.Image:
+    with span("s3.get"):
+        fp = _open_object(bucket_name, s3_object_key)
+        add_bytes(bytes_in=fp.seek(0, io.SEEK_END))
+        fp.seek(0)
+    with fp, span("decode"):
+        return decode_image(fp, max_dimension)
+
+
+def probe_image(bucket_name: str, s3_object_key: str) -> ImageInfo:
+    for probe_bytes in PROBE_RANGES:
+        response = get_backend().get(
+            bucket_name,
+            s3_object_key,
+            byte_range=(0, probe_bytes - 1),
+        )
+        data = b"".join(response["Body"])
+        info = parse_image_header(data)
+        if info is not None:
+            return info
+        if len(data) < probe_bytes:
+            break
+    msg = f"Cannot parse image header of {s3_object_key}."
+    raise ValueError(msg)
+
+
+def encode_image(image: Image.Image, encoding: ImageEncoding) -> bytes:
+    if encoding.format == "JPEG" and image.mode not in ("RGB", "L", "CMYK"):
+        image = image.convert("RGB")
+    with span("encode"):
+        image_buffer = io.BytesIO()
+        image.save(image_buffer, format=encoding.format, **encoding.save_options())
+        return image_buffer.getvalue()
+
+
+def head_object(bucket_name: str, s3_object_key: str) -> ObjectMeta | None:
+    with span("s3.head"):
+        head = get_backend().head(bucket_name, s3_object_key)
+    if head is None:
+        return None
+    return {
+        "Key": s3_object_key,
+        "Size": head["ContentLength"],
+        "Sha256": head["Metadata"].get(SHA256_METADATA_KEY, ""),
+    }
+
+
+def _head_if_readable(bucket_name: str, s3_object_key: str) -> ObjectMeta | None:
+    try:
+        return head_object(bucket_name, s3_object_key)
+    except ClientError as e:
+        # Without s3:ListBucket, S3 answers 403 for a key that does not exist yet.
+        if e.response["Error"]["Code"] in ("403", "AccessDenied", "Forbidden"):
+            return None
+        raise
+
+
+def put_object(
+    data: bytes,
+    bucket_name: str,
+    s3_object_key: str,
+    content_type: str,
+    *,
+    content_addressed: bool = False,
+) -> ObjectMeta:
+    meta: ObjectMeta = {
+        "Key": s3_object_key,
+        "Size": len(data),
+        "Sha256": hashlib.sha256(data).hexdigest(),
+    }
+    if content_addressed:
+        existing = _head_if_readable(bucket_name, s3_object_key)
+        if existing is not None and existing["Sha256"] == meta["Sha256"]:
+            logger.info(f"Skip uploading unchanged object {s3_object_key}")
+            return existing
+    with span("s3.put"):
+        get_backend().put(
+            bucket_name,
+            s3_object_key,
+            data,
+            content_type,
+            {SHA256_METADATA_KEY: meta["Sha256"]},
+        )
+        add_bytes(bytes_out=len(data))
+    # The cached copy, if any, is now stale.
+    _forget(bucket_name, s3_object_key)
+    return meta
+
+
+def put_image(
+    image: Image.Image,
+    bucket_name: str,
+    s3_object_key: str,
+    encoding: ImageEncoding = PUBLISH_ENCODING,
+    *,
+    content_addressed: bool = False,
+) -> ObjectMeta:
+    return put_object(
+        encode_image(image, encoding),
+        bucket_name,
+        s3_object_key,
+        encoding.content_type,
+        content_addressed=content_addressed,
     )
-    return s3_object_key
+
+
+def sniff_image(data: bytes) -> ImageInfo:
+    info = parse_image_header(data)
+    if info is None:
+        msg = "Unsupported or truncated image data."
+        raise ValueError(msg)
+    if not (
+        0 < info["Width"] <= MAX_IMAGE_DIMENSION
+        and 0 < info["Height"] <= MAX_IMAGE_DIMENSION
+    ):
+        msg = f"Invalid image dimensions {info['Width']}x{info['Height']}."
+        raise ValueError(msg)
+    return info
+
+
+def put_image_bytes(
+    data: bytes,
+    bucket_name: str,
+    s3_object_key: str,
+    *,
+    content_addressed: bool = False,
+) -> ObjectMeta:
+    # Stores already encoded bytes as they are; only the header is parsed.
+    info = sniff_image(data)
+    return put_object(
+        data,
+        bucket_name,
+        s3_object_key,
+        f"image/{info['Format'].lower()}",
+        content_addressed=content_addressed,
+    )
+
+
+def get_images(
+    bucket_name: str,
+    s3_object_keys: list[str],
+    max_dimension: int | None = None,
+) -> list[Image.Image | BaseException]:
+    return _map_settled(
+        lambda key: get_image(bucket_name, key, max_dimension),
+        s3_object_keys,
+    )
+
+
+def put_images(
+    items: list[PutItem],
+    encoding: ImageEncoding = PUBLISH_ENCODING,
+) -> list[ObjectMeta | BaseException]:
+    return _map_settled(lambda item: put_image(*item, encoding), items)
+
+
+def put_images_bytes(
+    items: list[PutBytesItem],
+) -> list[ObjectMeta | BaseException]:
+    return _map_settled(lambda item: put_image_bytes(*item), items)
+
+
+def put_all(
+    uploads: list[Callable[[], ObjectMeta]],
+) -> list[ObjectMeta | BaseException]:
+    # Uploads of different kinds, e.g. originals and thumbnails, share one batch.
+    return _map_settled(lambda upload: upload(), uploads)
@@ -0,0 +1,324 @@
+import hashlib
+import json
+import mimetypes
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections.abc import Iterator
+from functools import cache
+from pathlib import Path
+from typing import TYPE_CHECKING, TypedDict
+
+from botocore.exceptions import ClientError
+
+if TYPE_CHECKING:
+    from botocore.client import BaseClient
+
+S3_MAX_POOL_CONNECTIONS = int(os.getenv("S3_MAX_POOL_CONNECTIONS", "16"))
+READ_CHUNK_SIZE = 256 * 1024
+
+
+class StorageHead(TypedDict):
+    ContentLength: int
+    ContentType: str
+    ETag: str
+    Metadata: dict[str, str]
+
+
+class StorageObject(StorageHead):
+    Body: Iterator[bytes]
+
+
+class StorageBackend(ABC):
+    @abstractmethod
+    def get(
+        self,
+        bucket_name: str,
+        key: str,
+        byte_range: tuple[int, int] | None = None,
+    ) -> StorageObject: ...
+
+    @abstractmethod
+    def head(self, bucket_name: str, key: str) -> StorageHead | None: ...
+
+    @abstractmethod
+    def find(self, bucket_name: str, key: str) -> StorageObject | None: ...
+
+    @abstractmethod
+    def put(
+        self,
+        bucket_name: str,
+        key: str,
+        data: bytes,
+        content_type: str,
+        metadata: dict[str, str],
+    ) -> str: ...
+
+    @abstractmethod
+    def presigned_url(self, bucket_name: str, key: str, expiration: int) -> str: ...
+
+
+@cache
+def get_client() -> "BaseClient":
+    # boto3 is ~0.4 s of import; S3Backend() pulls it in, so prewarm covers it.
+    import boto3
+    from botocore.client import Config
+
+    return boto3.client(
+        "s3",
+        config=Config(
+            signature_version="s3v4",
+            max_pool_connections=S3_MAX_POOL_CONNECTIONS,
+            tcp_keepalive=True,
+            retries={"mode": "standard", "max_attempts": 3},
+        ),
+    )
+
+
+class S3Backend(StorageBackend):
+    def __init__(self) -> None:
+        self.client = get_client()
+
+    def get(
+        self,
+        bucket_name: str,
+        key: str,
+        byte_range: tuple[int, int] | None = None,
+    ) -> StorageObject:
+        kwargs = {}
+        if byte_range is not None:
+            kwargs["Range"] = f"bytes={byte_range[0]}-{byte_range[1]}"
+        response = self.client.get_object(Bucket=bucket_name, Key=key, **kwargs)
+        return {
+            "Body": response["Body"].iter_chunks(READ_CHUNK_SIZE),
+            "ContentLength": response["ContentLength"],
+            "ContentType": response.get("ContentType", ""),
+            "ETag": response["ETag"],
+            "Metadata": response.get("Metadata", {}),
+        }
+
+    def find(self, bucket_name: str, key: str) -> StorageObject | None:
+        # One GET instead of HEAD then GET; S3 answers 404 only with ListBucket.
+        try:
+            return self.get(bucket_name, key)
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    def head(self, bucket_name: str, key: str) -> StorageHead | None:
+        try:
+            response = self.client.head_object(Bucket=bucket_name, Key=key)
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+        return {
+            "ContentLength": response["ContentLength"],
+            "ContentType": response.get("ContentType", ""),
+            "ETag": response["ETag"],
+            "Metadata": response.get("Metadata", {}),
+        }
+
+    def put(
+        self,
+        bucket_name: str,
+        key: str,
+        data: bytes,
+        content_type: str,
+        metadata: dict[str, str],
+    ) -> str:
+        response = self.client.put_object(
+            Bucket=bucket_name,
+            Key=key,
+            Body=data,
+            ContentType=content_type,
+            Metadata=metadata,
+        )
+        return str(response["ETag"])
+
+    def presigned_url(self, bucket_name: str, key: str, expiration: int) -> str:
+        url: str = self.client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": bucket_name, "Key": key},
+            ExpiresIn=expiration,
+        )
+        return url
+
+
+class SimulatedBackend(StorageBackend):
+    def __init__(self, latency: float = 0.0, bandwidth: float = 0.0) -> None:
+        self.latency = latency
+        self.bandwidth = bandwidth
+
+    @abstractmethod
+    def _load(self, bucket_name: str, key: str) -> tuple[bytes, StorageHead] | None: ...
+
+    @abstractmethod
+    def _store(
+        self,
+        bucket_name: str,
+        key: str,
+        data: bytes,
+        head: StorageHead,
+    ) -> None: ...
+
+    def _transfer(self, size: int) -> None:
+        delay = self.latency + (size / self.bandwidth if self.bandwidth > 0 else 0)
+        if delay > 0:
+            time.sleep(delay)
+
+    def get(
+        self,
+        bucket_name: str,
+        key: str,
+        byte_range: tuple[int, int] | None = None,
+    ) -> StorageObject:
+        loaded = self._load(bucket_name, key)
+        if loaded is None:
+            msg = f"{bucket_name}/{key}"
+            raise FileNotFoundError(msg)
+        data, head = loaded
+        if byte_range is not None:
+            data = data[byte_range[0] : byte_range[1] + 1]
+        self._transfer(len(data))
+        chunks = (
+            data[i : i + READ_CHUNK_SIZE] for i in range(0, len(data), READ_CHUNK_SIZE)
+        )
+        return {**head, "ContentLength": len(data), "Body": chunks}
+
+    def find(self, bucket_name: str, key: str) -> StorageObject | None:
+        if self._load(bucket_name, key) is None:
+            self._transfer(0)
+            return None
+        return self.get(bucket_name, key)
+
+    def head(self, bucket_name: str, key: str) -> StorageHead | None:
+        self._transfer(0)
+        loaded = self._load(bucket_name, key)
+        return None if loaded is None else loaded[1]
+
+    def put(
+        self,
+        bucket_name: str,
+        key: str,
+        data: bytes,
+        content_type: str,
+        metadata: dict[str, str],
+    ) -> str:
+        self._transfer(len(data))
+        etag = f'"{hashlib.md5(data).hexdigest()}"'  # noqa: S324
+        self._store(
+            bucket_name,
+            key,
+            data,
+            {
+                "ContentLength": len(data),
+                "ContentType": content_type,
+                "ETag": etag,
+                "Metadata": metadata,
+            },
+        )
+        return etag
+
+
+class MemoryBackend(SimulatedBackend):
+    def __init__(self, latency: float = 0.0, bandwidth: float = 0.0) -> None:
+        super().__init__(latency, bandwidth)
+        self._objects: dict[tuple[str, str], tuple[bytes, StorageHead]] = {}
+        self._lock = threading.Lock()
+
+    def _load(self, bucket_name: str, key: str) -> tuple[bytes, StorageHead] | None:
+        with self._lock:
+            return self._objects.get((bucket_name, key))
+
+    def _store(
+        self,
+        bucket_name: str,
+        key: str,
+        data: bytes,
+        head: StorageHead,
+    ) -> None:
+        with self._lock:
+            self._objects[(bucket_name, key)] = (data, head)
+
+    def presigned_url(
+        self,
+        bucket_name: str,
+        key: str,
+        expiration: int,  # noqa: ARG002
+    ) -> str:
+        return f"memory://{bucket_name}/{key}"
+
+
+class LocalBackend(SimulatedBackend):
+    def __init__(
+        self,
+        directory: Path,
+        latency: float = 0.0,
+        bandwidth: float = 0.0,
+    ) -> None:
+        super().__init__(latency, bandwidth)
+        self.directory = directory
+
+    def _paths(self, bucket_name: str, key: str) -> tuple[Path, Path]:
+        return (
+            self.directory / bucket_name / key,
+            self.directory / ".meta" / bucket_name / f"{key}.json",
+        )
+
+    def _load(self, bucket_name: str, key: str) -> tuple[bytes, StorageHead] | None:
+        path, meta_path = self._paths(bucket_name, key)
+        if not path.exists():
+            return None
+        data = path.read_bytes()
+        if meta_path.exists():
+            head: StorageHead = json.loads(meta_path.read_text())
+            return data, head
+        # Files copied in by hand, e.g. real images to benchmark against offline.
+        content_type, _ = mimetypes.guess_type(path.name)
+        return data, {
+            "ContentLength": len(data),
+            "ContentType": content_type or "application/octet-stream",
+            "ETag": f'"{hashlib.md5(data).hexdigest()}"',  # noqa: S324
+            "Metadata": {},
+        }
+
+    def _store(
+        self,
+        bucket_name: str,
+        key: str,
+        data: bytes,
+        head: StorageHead,
+    ) -> None:
+        path, meta_path = self._paths(bucket_name, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        meta_path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+        meta_path.write_text(json.dumps(head))
+
+    def presigned_url(
+        self,
+        bucket_name: str,
+        key: str,
+        expiration: int,  # noqa: ARG002
+    ) -> str:
+        return self._paths(bucket_name, key)[0].resolve().as_uri()
+
+
+@cache
+def get_backend() -> StorageBackend:
+    backend = os.getenv("STORAGE_BACKEND", "s3")
+    if backend == "s3":
+        return S3Backend()
+    latency = float(os.getenv("STORAGE_LATENCY_MS", "0")) / 1000
+    # Megabits per second, as network links are usually quoted.
+    bandwidth = float(os.getenv("STORAGE_BANDWIDTH_MBPS", "0")) * 1_000_000 / 8
+    if backend == "memory":
+        return MemoryBackend(latency, bandwidth)
+    if backend == "local":
+        directory = Path(os.getenv("STORAGE_LOCAL_DIR", "/tmp/storage"))  # noqa: S108
+        return LocalBackend(directory, latency, bandwidth)
+    msg = f"Storage backend {backend} is not supported."
+    raise ValueError(msg)
@@ -0,0 +1,78 @@
+import hashlib
+import os
+import random
+import re
+from collections.abc import Iterator
+from contextlib import contextmanager
+from functools import cache
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from langsmith import Client
+
+# The variable LangSmith's client samples on, read here so that unsampled calls
+# skip building and serializing the run as well, not only the upload. Runs are
+# traced through get_client, which does not sample a second time.
+TRACE_SAMPLE_RATE = float(os.getenv("LANGSMITH_TRACING_SAMPLING_RATE", "1.0"))
+_DATA_URL = re.compile(r"data:([\w/+.-]+);base64,")
+
+
+def tracing_enabled() -> bool:
+    # Read per call, as setup_env sets it after import. This only trims and
+    # samples stages that already trace; it never turns tracing on.
+    return any(
+        os.getenv(name, "").lower() == "true"
+        for name in ("LANGSMITH_TRACING", "LANGCHAIN_TRACING_V2")
+    )
+
+
+def should_trace() -> bool:
+    return random.random() < TRACE_SAMPLE_RATE  # noqa: S311
+
+
+def _placeholder(kind: str, size: int, data: bytes) -> str:
+    return f"<{kind} {size} bytes sha256:{hashlib.sha256(data).hexdigest()[:16]}>"
+
+
+def redact(value: Any) -> Any:  # noqa: ANN401
+    # LangChain passes prompt values and messages through as pydantic models.
+    model_dump = getattr(value, "model_dump", None)
+    if callable(model_dump):
+        value = model_dump()
+    if isinstance(value, bytes | bytearray | memoryview):
+        return _placeholder("binary", len(value), bytes(value))
+    if isinstance(value, str):
+        match = _DATA_URL.match(value)
+        if match is None:
+            return value
+        size = (len(value) - match.end()) * 3 // 4
+        return _placeholder(f"data:{match.group(1)}", size, value.encode())
+    if isinstance(value, dict):
+        return {k: redact(v) for k, v in value.items()}
+    if isinstance(value, list | tuple):
+        return [redact(v) for v in value]
+    return value
+
+
+@cache
+def get_client() -> "Client":
+    from langsmith import Client
+
+    # should_trace already sampled; the client would sample the same rate again.
+    return Client(hide_inputs=redact, hide_outputs=redact, tracing_sampling_rate=1.0)
+
+
+@contextmanager
+def trace_context() -> Iterator[bool]:
+    if not tracing_enabled():
+        yield False
+        return
+    # langsmith is imported here so stages that never trace do not pay for it.
+    from langsmith import tracing_context
+
+    if not should_trace():
+        with tracing_context(enabled=False):
+            yield False
+        return
+    with tracing_context(client=get_client(), enabled=True):
+        yield True
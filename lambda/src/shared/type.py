@@ -1,4 +1,4 @@
-from typing import TypedDict
+from typing import NotRequired, TypedDict
 
 
 class GenTextResponse(TypedDict):
@@ -12,6 +12,16 @@ class GenTextResponse(TypedDict):
 
 class GenImgResponse(TypedDict):
     ImgKey: str
+    # Bounding size in px -> key, when GEN_IMG_THUMBNAIL_SIZES is set.
+    Thumbnails: NotRequired[dict[str, str]]
+
+
+class GenImgBatchResponse(TypedDict):
+    ImageKeys: list[str]
+    # Candidate index of each key; fewer than requested in best-effort mode.
+    Indices: list[int]
+    # Bounding size in px -> keys in ImageKeys order.
+    Thumbnails: NotRequired[dict[str, list[str]]]
 
 
 class SelectImgResponse(TypedDict):
@@ -20,3 +30,19 @@ class SelectImgResponse(TypedDict):
 
 class EditImgResponse(TypedDict):
     TitleImgKey: str
+    # Lets later stages compare against head_object instead of downloading.
+    TitleImgSize: int
+    TitleImgSha256: str
+
+
+class ObjectMeta(TypedDict):
+    Key: str
+    Size: int
+    Sha256: str
+
+
+class ImageInfo(TypedDict):
+    Width: int
+    Height: int
+    Mode: str
+    Format: str